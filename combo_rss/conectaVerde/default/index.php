@@ -14,6 +14,29 @@ function execInBackground($cmd)
     }
 }
 
+//Refresh daemon (feedengine.daemon) keeps feed.xml fresh while state.json is recent
+//and schedules this folder (the daemon may run for some folders only)
+function daemonRunning()
+{
+    $state = dirname(dirname(getcwd())) . DIRECTORY_SEPARATOR . 'state.json';
+    if (!file_exists($state) || time() - filemtime($state) >= 300) {
+        return false;
+    }
+    $data = json_decode(file_get_contents($state), true);
+    $folder = basename(dirname(getcwd())) . '/' . basename(getcwd());
+    if (!isset($data['sources'][$folder]['due'])) {
+        return false;
+    }
+    //Due soon or not overdue by more than a stale refresh lock
+    return $data['sources'][$folder]['due'] > time() - 600;
+}
+
+//Another feed.py is already refreshing this folder (feedengine/lock.py)
+function refreshRunning()
+{
+    return file_exists('feed.lock') && time() - filemtime('feed.lock') < 600;
+}
+
 // Get feed.xml file time if exists
 if (file_exists('feed.xml')) {
     $feedtime = filemtime('feed.xml');
@@ -22,7 +45,7 @@ if (file_exists('feed.xml')) {
     $hour = 1;
     $time = $hour * 60 * 60;
     //If feed.xml is older than 1 hour
-    if ($now - $feedtime > $time) {
+    if ($now - $feedtime > $time && !daemonRunning() && !refreshRunning()) {
         //Get current working directory
         $cwd = getcwd();
         //Back two folders
@@ -34,7 +57,7 @@ if (file_exists('feed.xml')) {
        //var_dump($command);
         execInBackground($command);
     }
-} else {
+} elseif (!daemonRunning() && !refreshRunning()) {
     // Se o arquivo não existe, tenta executar o script para criá-lo
     $cwd = getcwd();
     $cwd = substr($cwd, 0, strrpos($cwd, '\\'));
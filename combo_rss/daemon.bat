@@ -0,0 +1 @@
+.\Python311\python.exe -m feedengine.daemon
\ No newline at end of file
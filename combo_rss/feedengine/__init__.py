@@ -0,0 +1,16 @@
+# Python 3.11.1
+# combo_rss shared feed engine
+
+from .engine import FeedEngine, runFolder, runSources
+from .orchestrator import runConcurrent
+from .registry import SOURCES, getSource, getSources
+
+__all__ = [
+    "FeedEngine",
+    "SOURCES",
+    "getSource",
+    "getSources",
+    "runConcurrent",
+    "runFolder",
+    "runSources",
+]
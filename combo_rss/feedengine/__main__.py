@@ -0,0 +1,61 @@
+# Python 3.11.1
+# Usage: Python311\python.exe -m feedengine [--parallel N] [--deadline S]
+#        [--mode tasks|processes] [--wait] [--replay URL] [folder ...]
+
+import argparse
+import os
+import sys
+
+from .client import REPLAY_ENV
+from .engine import ROOT, setupLogging
+from .orchestrator import MODES, STATUS_ERROR, STATUS_TIMEOUT, runConcurrent
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="feedengine", description="Refresh combo_rss feeds in one process"
+    )
+    parser.add_argument(
+        "folders", nargs="*", help="source folders like g1/default, all when empty"
+    )
+    parser.add_argument(
+        "--parallel", type=int, default=8, help="sources refreshed at the same time"
+    )
+    parser.add_argument(
+        "--deadline", type=float, default=120, help="seconds allowed per source"
+    )
+    parser.add_argument(
+        "--mode",
+        choices=MODES,
+        default="tasks",
+        help="asyncio tasks (network bound) or worker processes (CPU bound)",
+    )
+    parser.add_argument(
+        "--wait",
+        action="store_true",
+        help="wait for folders another process is refreshing instead of skipping",
+    )
+    parser.add_argument(
+        "--replay",
+        help="send every request to this replay server (feedengine.replay) instead",
+    )
+    args = parser.parse_args()
+    # Worker processes inherit it too #
+    if args.replay:
+        os.environ[REPLAY_ENV] = args.replay
+    setupLogging(os.path.join(ROOT, "feed.log"))
+    results = runConcurrent(
+        args.folders, args.parallel, args.deadline, args.mode, args.wait
+    )
+    for name, work in results.items():
+        print(
+            "{} RETURNS {} in {}s {}".format(
+                name, work["status"], work["seconds"], work["error"] or ""
+            ).rstrip()
+        )
+    failed = (STATUS_ERROR, STATUS_TIMEOUT)
+    return 1 if any(work["status"] in failed for work in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
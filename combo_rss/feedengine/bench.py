@@ -0,0 +1,412 @@
+# Python 3.11.1
+# Offline benchmark: what a refresh costs, stage by stage
+# Usage: Python311\python.exe -m feedengine.bench [--rounds N] [--output FILE]
+#        [--compare FILE] [--no-memory] [--record] [--regenerate] [folder ...]
+#
+# Every source runs against fixtures (see fixtures.py) in a temp root, so
+# nothing touches the network or the real folders. Stages per source and
+# round:
+#   fetch      getFeed of every url (replayed, no network)
+#   parse      iterItems of every body
+#   filter     blocked words and min_description (checkItem)
+#   dates      pubDate parsing and age check (max_age sources only)
+#   build      records and image urls of the accepted items (buildItem)
+#   serialize  writeFeed
+#   normalize  image resize / recompression of the downloads, in process
+#   write      image cache store and link into images/
+#   refresh    the whole engine refresh on an empty store and image cache
+#   warm       the same refresh again
+# Latency percentiles (ms) and the traced memory each stage allocates at
+# its peak are printed and saved as JSON under bench/results/ to compare
+# runs before / after a change.
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from . import dates, fetch, fixtures, registry, writer
+from .blocked import BlockedWordsProvider
+from .engine import ROOT, FeedEngine
+from .imagecache import ImageCache
+from .images import needsNormalize, normalizeImage
+from .rules import extractorFields, firstText
+
+RESULTS = os.path.join(ROOT, "bench", "results")
+STAGES = (
+    "fetch",
+    "parse",
+    "filter",
+    "dates",
+    "build",
+    "serialize",
+    "normalize",
+    "write",
+    "refresh",
+    "warm",
+)
+PERCENTILES = (50, 90, 99)
+
+
+# Nearest rank percentile of sorted values #
+def percentile(values, rank):
+    index = max(0, min(len(values) - 1, round(rank / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+
+def summarize(samples):
+    values = sorted(samples)
+    if not values:
+        return {"count": 0}
+    summary = {"count": len(values)}
+    for rank in PERCENTILES:
+        summary["p{}".format(rank)] = round(percentile(values, rank) * 1000, 3)
+    summary["max"] = round(values[-1] * 1000, 3)
+    summary["mean"] = round(sum(values) / len(values) * 1000, 3)
+    summary["total"] = round(sum(values) * 1000, 3)
+    return summary
+
+
+# Highest resident memory of this process so far, None when unknown #
+def peakRss():
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(
+            process, ctypes.byref(counters), counters.cb
+        ):
+            return counters.PeakWorkingSetSize
+    except (AttributeError, OSError):
+        pass
+    return None
+
+
+# Source settings for a bench run: fixture dates age with the fixtures, so
+# max_age is stretched by the fixture age to keep the same items
+def benchSource(source, fixtureSet, now):
+    source = dict(source)
+    created = [
+        fixtureSet[url]["created"]
+        for url, _ in source["urls"]
+        if url in fixtureSet and fixtureSet[url]["created"]
+    ]
+    if source["max_age"] is not None and created:
+        source["max_age"] += max(0, now - min(created))
+    return source
+
+
+class Bench:
+    def __init__(self, sources, fixtureSet, root, memory=True):
+        self.sources = sources
+        self.fixtures = fixtureSet
+        self.root = root
+        self.memory = memory
+        self.tracing = False
+        self.samples = {}
+        self.peaks = {}
+        self.counts = {}
+
+    # Time a stage, or when tracing its peak memory over what was already
+    # allocated when it started (reset_peak resets to that, not to zero) #
+    @contextlib.contextmanager
+    def stage(self, name, stage):
+        if self.tracing:
+            tracemalloc.reset_peak()
+            resident = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - started
+        if self.tracing:
+            peak = tracemalloc.get_traced_memory()[1] - resident
+            key = (name, stage)
+            self.peaks[key] = max(self.peaks.get(key, 0), peak)
+        else:
+            self.samples.setdefault((name, stage), []).append(elapsed)
+
+    def engine(self, root, client):
+        provider = BlockedWordsProvider(cacheFile=os.path.join(root, "blocked_words.json"))
+        return FeedEngine(root, client=client, blockedWords=provider)
+
+    # Every stage of one source, outside the engine so each one is timed
+    # on its own. Mirrors FeedEngine.update without the item store.
+    async def stages(self, engine, cache, source):
+        name = source["name"]
+        folder = os.path.join(engine.root, "stages", name)
+        os.makedirs(os.path.join(folder, "images"), exist_ok=True)
+        matcher = await engine.getMatcher() if source["block_fields"] else None
+        with self.stage(name, "fetch"):
+            responses = []
+            for url, publisher in source["urls"]:
+                response = await fetch.getFeed(engine.client, url, source)
+                if response is not None:
+                    responses.append((publisher, response))
+        skip = fetch.HEAVY_FIELDS - extractorFields(source["image"])
+        channel = {}
+        with self.stage(name, "parse"):
+            items = [
+                (publisher, item)
+                for publisher, response in responses
+                for item in fetch.iterItems(
+                    response["content"], source["recover"], channel, skip
+                )
+            ]
+        with self.stage(name, "filter"):
+            accepted = [
+                (publisher, item)
+                for publisher, item in items
+                if engine.checkItem(source, item, matcher)
+            ]
+        if source["max_age"] is not None:
+            parser = dates.PubDateParser()
+            nowtime = time.time()
+            with self.stage(name, "dates"):
+                recent = []
+                for publisher, item in accepted:
+                    try:
+                        pubDate = parser.parse(firstText(item.get("pubDate")))
+                    except ValueError:
+                        continue
+                    if nowtime - pubDate <= source["max_age"]:
+                        recent.append((publisher, item))
+                accepted = recent
+        limit = source["max_items"]
+        with self.stage(name, "build"):
+            records = []
+            images = []
+            for publisher, item in accepted:
+                built, _ = await engine.buildItem(source, item, publisher)
+                if built is None:
+                    continue
+                record, image = engine.placeItem(source, built, len(records))
+                records.append(record)
+                if image is not None:
+                    images.append(image)
+                if limit is not None and len(records) >= limit:
+                    break
+        with self.stage(name, "serialize"):
+            writer.writeFeed(
+                os.path.join(folder, source["output"]),
+                records,
+                layout=source["layout"],
+                stamp=time.ctime() if source["layout"] == "player" else None,
+                channelInfo={key: firstText(value) for key, value in channel.items()}
+                if source["layout"] == "channel"
+                else None,
+                compact=source["compact"],
+            )
+        size, budget = source["image_size"], source["image_bytes"]
+        with self.stage(name, "normalize"):
+            files = []
+            for index, (url, linkfoto) in enumerate(images):
+                if url not in self.fixtures:
+                    continue
+                ext = os.path.splitext(linkfoto)[1].lstrip(".").lower()
+                download = os.path.join(folder, "download{}".format(index))
+                filename = "{}.{}".format(download, ext)
+                with open(download, "wb") as f:
+                    f.write(engine.client.body(url))
+                if needsNormalize(download, size, budget):
+                    normalizeImage(download, filename, size, budget, source["quality"])
+                    os.remove(download)
+                else:
+                    os.replace(download, filename)
+                files.append((filename, ext, linkfoto))
+        with self.stage(name, "write"):
+            for filename, ext, linkfoto in files:
+                cache.link(cache.store(filename, ext), os.path.join(folder, linkfoto))
+        self.counts[name] = {
+            "items": len(items),
+            "accepted": len(accepted),
+            "built": len(records),
+            "images": len(files),
+        }
+
+    # One round over every source in a fresh root: stages, then a cold
+    # and a warm engine refresh
+    async def round(self):
+        root = tempfile.mkdtemp(prefix="round", dir=self.root)
+        client = fixtures.ReplayClient(self.fixtures)
+        cache = ImageCache(os.path.join(root, "stages", "cache"))
+        async with self.engine(root, client) as engine:
+            for source in self.sources:
+                await self.stages(engine, cache, source)
+            for stage in ("refresh", "warm"):
+                for source in self.sources:
+                    os.makedirs(os.path.join(root, source["name"]), exist_ok=True)
+                    with self.stage(source["name"], stage):
+                        try:
+                            await engine.refresh(source)
+                        except Exception as e:
+                            logging.error("{} | ERROR {}".format(source["name"], e))
+        shutil.rmtree(root, ignore_errors=True)
+
+    async def run(self, rounds, warmup=1):
+        for _ in range(warmup):
+            await self.round()
+        self.samples = {}
+        for _ in range(rounds):
+            await self.round()
+        # Memory in its own round, tracing slows everything down #
+        if self.memory:
+            self.tracing = True
+            tracemalloc.start()
+            try:
+                await self.round()
+            finally:
+                tracemalloc.stop()
+                self.tracing = False
+
+    def results(self, rounds):
+        names = [source["name"] for source in self.sources]
+        stages = {}
+        for stage in STAGES:
+            samples = [
+                value for name in names for value in self.samples.get((name, stage), ())
+            ]
+            stages[stage] = summarize(samples)
+            peaks = [self.peaks[(name, stage)] for name in names if (name, stage) in self.peaks]
+            if peaks:
+                stages[stage]["peak_kb"] = round(max(peaks) / 1024)
+        perSource = {
+            name: dict(
+                self.counts.get(name, {}),
+                stages={
+                    stage: summarize(self.samples[(name, stage)])
+                    for stage in STAGES
+                    if (name, stage) in self.samples
+                },
+            )
+            for name in names
+        }
+        recorded = fixtures.loadManifest(fixtures.RECORDED)["urls"]
+        rss = peakRss()
+        return {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "rounds": rounds,
+            "fixtures": {
+                "recorded": sum(
+                    1 for source in self.sources for url, _ in source["urls"] if url in recorded
+                ),
+                "feeds": sum(len(source["urls"]) for source in self.sources),
+            },
+            "peak_rss_kb": round(rss / 1024) if rss else None,
+            "stages": stages,
+            "sources": perSource,
+        }
+
+
+def printResults(results, previous=None):
+    header = "{:<10} {:>6} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+        "stage", "count", "p50 ms", "p90 ms", "p99 ms", "max ms", "peak KB"
+    )
+    if previous is not None:
+        header += " {:>10}".format("p50 before")
+    print(header)
+    for stage, summary in results["stages"].items():
+        if not summary["count"]:
+            continue
+        line = "{:<10} {:>6} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+            stage,
+            summary["count"],
+            summary["p50"],
+            summary["p90"],
+            summary["p99"],
+            summary["max"],
+            summary.get("peak_kb", "-"),
+        )
+        if previous is not None:
+            before = previous["stages"].get(stage, {}).get("p50")
+            line += " {:>10}".format(before if before is not None else "-")
+        print(line)
+    print("peak RSS KB: {}".format(results["peak_rss_kb"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="feedengine.bench", description="Time every refresh stage against fixtures"
+    )
+    parser.add_argument(
+        "folders", nargs="*", help="source folders like g1/default, all when empty"
+    )
+    parser.add_argument("--rounds", type=int, default=5, help="timed rounds")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed rounds first")
+    parser.add_argument("--output", help="results file, bench/results/<time>.json when empty")
+    parser.add_argument("--compare", help="results file of an earlier run to show next to this one")
+    parser.add_argument("--no-memory", action="store_true", help="skip the memory round")
+    parser.add_argument(
+        "--record", action="store_true", help="record fixtures from the network and exit"
+    )
+    parser.add_argument(
+        "--regenerate", action="store_true", help="generate the synthetic fixtures again"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR, format="%(message)s")
+    sources = registry.getSources(args.folders)
+    if args.record:
+        fixtures.runRecord(sources)
+        return 0
+    if args.regenerate:
+        fixtures.removeGenerated()
+    fixtures.generateFixtures(sources)
+    fixtureSet = fixtures.loadFixtures()
+    now = time.time()
+    sources = [benchSource(source, fixtureSet, now) for source in sources]
+    root = tempfile.mkdtemp(prefix="feedbench")
+    try:
+        bench = Bench(sources, fixtureSet, root, memory=not args.no_memory)
+        asyncio.run(bench.run(args.rounds, args.warmup))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    results = bench.results(args.rounds)
+    output = args.output or os.path.join(
+        RESULTS, time.strftime("bench-%Y%m%d-%H%M%S.json")
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=1)
+    previous = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+    printResults(results, previous)
+    print("Saved {}".format(output))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
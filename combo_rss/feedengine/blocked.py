@@ -0,0 +1,180 @@
+# Python 3.11.1
+# Blocked words loading and matching
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+
+import aiohttp
+
+from .text import foldOffsets, foldText
+
+UTILS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "utils")
+BLOCKED_WORDS_URL = "https://combosmart.com/rsspanel/users_data/Kanjiko.json"
+BLOCKED_WORDS_FILE = os.path.join(UTILS, "blocked_words.json")
+# Last remote list and its validators, shared by every process #
+BLOCKED_WORDS_CACHE = os.path.join(UTILS, "blocked_words.cache.json")
+# Seconds before the cached list is revalidated against the remote #
+BLOCKED_WORDS_TTL = 3600
+
+
+# Content hash of a word list, changes whenever the matcher must be rebuilt #
+def wordsKey(words):
+    return hashlib.sha1("\n".join(words).encode("utf-8")).hexdigest()
+
+
+# Blocked words loaded once per process and kept on disk for `ttl` seconds
+# Order of preference: fresh disk cache, remote (conditional request),
+# stale disk cache, utils/blocked_words.json
+class BlockedWordsProvider:
+    def __init__(
+        self, url=BLOCKED_WORDS_URL, cacheFile=BLOCKED_WORDS_CACHE, ttl=BLOCKED_WORDS_TTL
+    ):
+        self.url = url
+        self.cacheFile = cacheFile
+        self.ttl = ttl
+        self.words = None
+        self.key = ""
+        self.loaded = 0
+        self.lock = None
+
+    def readCache(self):
+        try:
+            with open(self.cacheFile, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    # Temp name per pid, feed.py processes may write at the same time #
+    def writeCache(self, cache):
+        temp = "{}.{}.tmp".format(self.cacheFile, os.getpid())
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(temp, self.cacheFile)
+
+    def readLocal(self):
+        with open(BLOCKED_WORDS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f).get("default_words", [])
+
+    # Conditional request for the list, None on failure #
+    async def revalidate(self, client, cache):
+        headers = {}
+        if cache and cache.get("etag"):
+            headers["If-None-Match"] = cache["etag"]
+        if cache and cache.get("last_modified"):
+            headers["If-Modified-Since"] = cache["last_modified"]
+        try:
+            async with client.get(self.url, headers=headers) as response:
+                if response.status == 304 and cache:
+                    logging.info("Blocked words not modified")
+                    return dict(cache, fetched=time.time())
+                if response.status != 200:
+                    logging.error("Failed to get blocked words from {}".format(self.url))
+                    return None
+                data = await response.json(content_type=None)
+                return {
+                    "words": data.get("default_words", []),
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "fetched": time.time(),
+                }
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logging.error("Failed to get blocked words from {}: {}".format(self.url, e))
+            return None
+
+    async def load(self, client):
+        cache = self.readCache()
+        if cache and time.time() - cache.get("fetched", 0) < self.ttl:
+            return cache["words"]
+        fresh = await self.revalidate(client, cache)
+        if fresh is not None:
+            self.writeCache(fresh)
+            return fresh["words"]
+        if cache:
+            logging.info("Using cached blocked words from {}".format(self.cacheFile))
+            return cache["words"]
+        logging.info("Using local blocked words from {}".format(BLOCKED_WORDS_FILE))
+        return self.readLocal()
+
+    # Get the blocked words, loaded at most once per ttl #
+    async def get(self, client):
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            if self.words is None or time.time() - self.loaded >= self.ttl:
+                self.words = await self.load(client)
+                self.key = wordsKey(self.words)
+                self.loaded = time.time()
+        return self.words
+
+
+# Build a regex from a trie of words, so the engine walks the shared
+# prefixes once instead of trying every word at every position
+def trieRegex(node):
+    alternatives = [
+        re.escape(char) + trieRegex(child) for char, child in sorted(node.items()) if char
+    ]
+    if not alternatives:
+        return ""
+    if len(alternatives) == 1 and "" not in node:
+        return alternatives[0]
+    pattern = "(?:{})".format("|".join(alternatives))
+    # A word ends here too: try the longer words first, then stop #
+    if "" in node:
+        pattern += "?"
+    return pattern
+
+
+# Every blocked word compiled into one pattern, scanned once per text
+# Words and text are folded (accents and case), so "assedio" also blocks
+# "Assédio" and each variant only needs one entry. Words are plain text
+# matched as whole words, at most one hit (the longest) per position.
+class BlockedMatcher:
+    def __init__(self, words):
+        self.words = {}
+        trie = {}
+        for word in words:
+            key = foldText(word.strip())
+            if not key or key in self.words:
+                continue
+            self.words[key] = word
+            node = trie
+            for char in key:
+                node = node.setdefault(char, {})
+            node[""] = {}
+        self.finditer = None
+        if trie:
+            self.finditer = re.compile(
+                r"(?=(?<!\w)({})(?!\w))".format(trieRegex(trie))
+            ).finditer
+
+    # Every hit as (word, start, end), offsets in the original text #
+    def find(self, text):
+        if self.finditer is None or not text:
+            return []
+        matches = list(self.finditer(foldText(text)))
+        if not matches:
+            return []
+        # ASCII text folds to the same length, offsets are unchanged #
+        offsets = None if text.isascii() else foldOffsets(text)
+        hits = []
+        for match in matches:
+            start, end = match.span(1)
+            if offsets is not None:
+                start, end = offsets[start], offsets[end - 1] + 1
+            hits.append((self.words[match.group(1)], start, end))
+        return hits
+
+
+# Compile the word list once, shared by all sources in the run #
+def compileBlockedWords(words):
+    return BlockedMatcher(words)
+
+
+# Get every blocked word found in text, once each #
+def findBlocked(matcher, text):
+    return list(dict.fromkeys(word for word, _, _ in matcher.find(text)))
@@ -0,0 +1,142 @@
+# Python 3.11.1
+# Resident refresh daemon: keeps every feed.xml fresh so index.php only reads files
+#
+# Usage: Python311\python.exe -m feedengine.daemon [--parallel N] [folder ...]
+#
+# Keeps a min-heap of (next due time, folder). A folder is refreshed a bit
+# before its interval expires, with random jitter so sources sharing a host
+# don't all hit the network at once. The daemon rewrites state.json on every
+# tick; index.php skips spawning feed.py while that file is recent and
+# lists its folder with a refresh not long overdue.
+
+import argparse
+import asyncio
+import heapq
+import json
+import logging
+import os
+import random
+import time
+
+from . import registry
+from .engine import ROOT, FeedEngine, setupLogging
+from .orchestrator import STATUS_OK, STATUS_SKIPPED, refreshWithDeadline
+
+STATE_FILE = os.path.join(ROOT, "state.json")
+# index.php treats the daemon as dead when state.json is older than this #
+HEARTBEAT = 60
+# Retry delay after a failed refresh #
+RETRY = 300
+# Delay before trying again a folder another process was refreshing #
+BUSY_RETRY = 30
+
+
+class RefreshDaemon:
+    def __init__(self, names=None, parallel=8, deadline=120, ahead=0.1, jitter=0.05):
+        self.sources = {source["name"]: source for source in registry.getSources(names)}
+        self.parallel = parallel
+        self.deadline = deadline
+        self.ahead = ahead
+        self.jitter = jitter
+        self.heap = []
+        self.state = {}
+        self.running = set()
+
+    # Next refresh time: before expiry by `ahead`, spread by `jitter` #
+    def nextDue(self, source, refreshed):
+        interval = source["interval"]
+        spread = random.uniform(-self.jitter, self.jitter) * interval
+        return refreshed + interval * (1 - self.ahead) + spread
+
+    # Schedule every source from its current feed.xml age #
+    def schedule(self):
+        now = time.time()
+        for name, source in self.sources.items():
+            output = os.path.join(ROOT, name, source["output"])
+            if os.path.exists(output):
+                due = max(now, self.nextDue(source, os.path.getmtime(output)))
+            else:
+                due = now
+            heapq.heappush(self.heap, (due, name))
+            self.state[name] = {"due": due, "refreshed": None, "status": None}
+
+    # Write state.json atomically, it doubles as the daemon heartbeat #
+    def writeState(self):
+        state = {
+            "pid": os.getpid(),
+            "heartbeat": time.time(),
+            "sources": self.state,
+        }
+        temp = STATE_FILE + ".tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        os.replace(temp, STATE_FILE)
+
+    async def refresh(self, engine, semaphore, name):
+        source = self.sources[name]
+        async with semaphore:
+            work = await refreshWithDeadline(engine, source, self.deadline)
+        now = time.time()
+        if work["status"] == STATUS_OK:
+            due = self.nextDue(source, now)
+        elif work["status"] == STATUS_SKIPPED:
+            due = now + min(BUSY_RETRY, source["interval"])
+        else:
+            due = now + min(RETRY, source["interval"])
+        heapq.heappush(self.heap, (due, name))
+        self.state[name] = {
+            "due": due,
+            "refreshed": now if work["status"] == STATUS_OK else self.state[name]["refreshed"],
+            "status": work["status"],
+            "seconds": work["seconds"],
+            "error": work["error"],
+        }
+        self.running.discard(name)
+        self.writeState()
+
+    async def run(self):
+        self.schedule()
+        semaphore = asyncio.Semaphore(self.parallel)
+        tasks = set()
+        async with FeedEngine() as engine:
+            while True:
+                now = time.time()
+                # Start every due source #
+                while self.heap and self.heap[0][0] <= now:
+                    due, name = heapq.heappop(self.heap)
+                    if name in self.running:
+                        continue
+                    self.running.add(name)
+                    task = asyncio.create_task(self.refresh(engine, semaphore, name))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                self.writeState()
+                # Sleep until the next due source or the next heartbeat #
+                wait = HEARTBEAT
+                if self.heap:
+                    wait = min(wait, max(0, self.heap[0][0] - time.time()))
+                await asyncio.sleep(wait)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="feedengine.daemon", description="Keep combo_rss feeds fresh"
+    )
+    parser.add_argument(
+        "folders", nargs="*", help="source folders like g1/default, all when empty"
+    )
+    parser.add_argument(
+        "--parallel", type=int, default=8, help="sources refreshed at the same time"
+    )
+    parser.add_argument(
+        "--deadline", type=float, default=120, help="seconds allowed per source"
+    )
+    args = parser.parse_args()
+    setupLogging(os.path.join(ROOT, "feed.log"))
+    daemon = RefreshDaemon(args.folders, args.parallel, args.deadline)
+    logging.info("Daemon started with {} sources".format(len(daemon.sources)))
+    asyncio.run(daemon.run())
+
+
+if __name__ == "__main__":
+    main()
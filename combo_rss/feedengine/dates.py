@@ -0,0 +1,169 @@
+# Python 3.11.1
+# pubDate parsing
+#
+# RFC 822 / 2822 ("Thu, 14 Mar 2024 21:26:11 -0000", "Tue, 09 Apr 2024
+# 11:21:35 GMT") and RFC 3339 ("2024-03-14T21:26:11-03:00") dates are
+# parsed with one regex each and converted with their offset or named zone
+# (time.mktime used to ignore both). Dates without a zone are local time,
+# as before; an unknown zone name or an impossible date ("31 Feb") rejects
+# the date instead of guessing. A PubDateParser remembers which format a
+# source uses and tries it first.
+
+import calendar
+import email.utils
+import re
+import time
+
+# Bump when parsing changes, stored pubDates are recomputed #
+PARSER_VERSION = 3
+
+RFC822 = re.compile(
+    r"\s*(?:[A-Za-z]+,?\s*)?(\d{1,2})\s+([A-Za-z]{3})[A-Za-z.]*\s+(\d{2,4})\s+"
+    r"(\d{1,2}):(\d{2})(?::(\d{2}))?(?:\s*([+-]\d{2}:?\d{2}|[A-Za-z]+))?\s*$"
+)
+RFC3339 = re.compile(
+    r"\s*(\d{4})-(\d{2})-(\d{2})[Tt ](\d{2}):(\d{2})(?::(\d{2})(?:[.,]\d+)?)?"
+    r"\s*([Zz]|[+-]\d{2}:?\d{2})?\s*$"
+)
+
+# English and Portuguese month abbreviations #
+MONTHS = {
+    name: number
+    for number, names in enumerate(
+        (
+            ("jan",),
+            ("feb", "fev"),
+            ("mar",),
+            ("apr", "abr"),
+            ("may", "mai"),
+            ("jun",),
+            ("jul",),
+            ("aug", "ago"),
+            ("sep", "set"),
+            ("oct", "out"),
+            ("nov",),
+            ("dec", "dez"),
+        ),
+        start=1,
+    )
+    for name in names
+}
+
+# Named zones in hours from UTC, RFC 822 plus Brazil #
+ZONES = {
+    "gmt": 0,
+    "ut": 0,
+    "utc": 0,
+    "z": 0,
+    "est": -5,
+    "edt": -4,
+    "cst": -6,
+    "cdt": -5,
+    "mst": -7,
+    "mdt": -6,
+    "pst": -8,
+    "pdt": -7,
+    "brt": -3,
+    "brst": -2,
+}
+
+
+# Seconds east of UTC for "+0300", "-03:00" or a zone name, None when unknown #
+def zoneOffset(zone):
+    if zone is None:
+        return None
+    if zone[0] in "+-":
+        digits = zone[1:].replace(":", "")
+        if int(digits[2:]) > 59:
+            return None
+        offset = int(digits[:2]) * 3600 + int(digits[2:]) * 60
+        return -offset if zone[0] == "-" else offset
+    hours = ZONES.get(zone.lower())
+    return None if hours is None else hours * 3600
+
+
+# Epoch seconds, None for an impossible date (calendar.timegm would roll
+# 31 Feb over to March) or an unknown zone #
+def toEpoch(year, month, day, hour, minute, second, zone):
+    if not 1 <= month <= 12 or not 1 <= day <= calendar.monthrange(year, month)[1]:
+        return None
+    if hour > 23 or minute > 59 or second > 60:
+        return None
+    fields = (year, month, day, hour, minute, second)
+    if zone is None:
+        return time.mktime(fields + (0, 0, -1))
+    offset = zoneOffset(zone)
+    if offset is None:
+        return None
+    return calendar.timegm(fields) - offset
+
+
+def parseRfc822(text):
+    match = RFC822.match(text)
+    if match is None:
+        return None
+    day, monthName, year, hour, minute, second, zone = match.groups()
+    month = MONTHS.get(monthName.lower())
+    if month is None:
+        return None
+    year = int(year)
+    if year < 100:
+        year += 2000 if year < 50 else 1900
+    return toEpoch(year, month, int(day), int(hour), int(minute), int(second or 0), zone)
+
+
+def parseRfc3339(text):
+    match = RFC3339.match(text)
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, zone = match.groups()
+    return toEpoch(
+        int(year), int(month), int(day), int(hour), int(minute), int(second or 0), zone
+    )
+
+
+# Anything else email.utils understands. RFC 822 shaped dates were already
+# judged by parseRfc822 (email.utils takes unknown zones as local time) #
+def parseEmail(text):
+    if RFC822.match(text):
+        return None
+    try:
+        moment = email.utils.parsedate_to_datetime(text)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if moment.tzinfo is None:
+        return time.mktime(moment.timetuple())
+    return moment.timestamp()
+
+
+PARSERS = (parseRfc822, parseRfc3339, parseEmail)
+
+
+# pubDate parser for one source, trying the format that worked last first #
+class PubDateParser:
+    def __init__(self):
+        self.last = 0
+
+    def parse(self, text):
+        value = self.tryParser(self.last, text)
+        if value is not None:
+            return value
+        for index in range(len(PARSERS)):
+            if index == self.last:
+                continue
+            value = self.tryParser(index, text)
+            if value is not None:
+                self.last = index
+                return value
+        raise ValueError("Unknown pubDate format: {}".format(text))
+
+    def tryParser(self, index, text):
+        try:
+            return PARSERS[index](text)
+        except (ValueError, OverflowError):
+            return None
+
+
+# Get pubDate as epoch seconds #
+def parsePubDate(text):
+    return PubDateParser().parse(text)
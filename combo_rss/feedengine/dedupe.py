@@ -0,0 +1,73 @@
+# Python 3.11.1
+# Duplicate detection for feeds merging several publishers
+#
+# Every item gets a few normalized keys: its canonical link, its guid and
+# its folded title. An item is a duplicate when any of its keys was already
+# added, one set lookup per key however many items and publishers the
+# merged feed has.
+
+import re
+from html import unescape
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from .rules import firstText
+from .text import foldText
+
+# Query parameters that only track the click, not the story #
+TRACKING = re.compile(r"^(utm_\w+|fbclid|gclid|ref|cmpid|origin)$")
+WORDS = re.compile(r"\w+")
+
+
+# Same story link however it was shared: no scheme, www, tracking or anchor #
+def canonicalLink(url):
+    url = url.strip()
+    if "://" not in url:
+        return None
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not TRACKING.match(key)
+    )
+    link = host + (parts.path.rstrip("/") or "/")
+    if query:
+        link += "?" + urlencode(query)
+    return link
+
+
+# Title words only, folded: "Dólar SOBE!" and "dolar sobe" are the same #
+def titleKey(title):
+    return " ".join(WORDS.findall(foldText(unescape(title))))
+
+
+# Keys of an item, links and url guids share the "link" kind #
+def itemKeys(item):
+    keys = []
+    for field in ("link", "guid"):
+        value = firstText(item.get(field)).strip()
+        if not value:
+            continue
+        link = canonicalLink(value)
+        keys.append(("link", link) if link else (field, value))
+    title = titleKey(firstText(item.get("title")))
+    if title:
+        keys.append(("title", title))
+    return keys
+
+
+class SeenIndex:
+    def __init__(self):
+        self.keys = set()
+
+    # Kind of the first key already seen ("link", "guid", "title"), else None #
+    def find(self, item):
+        for key in itemKeys(item):
+            if key in self.keys:
+                return key[0]
+        return None
+
+    def add(self, item):
+        self.keys.update(itemKeys(item))
@@ -0,0 +1,520 @@
+# Python 3.11.1
+# Shared feed engine: one process, one HTTP pool, one blocked words matcher
+
+import asyncio
+import collections
+import hashlib
+import json
+import logging
+import os
+import time
+from urllib.parse import urljoin
+
+from . import blocked, cluster, dates, fetch, registry, writer
+from .client import FetchClient
+from .cluster import ClusterIndex
+from .dedupe import SeenIndex
+from .imagecache import ImageCache
+from .images import ImageDownloader
+from .lock import LOCK_FILE, FileLock
+from .rules import (
+    DESCRIPTIONS,
+    EXTRACTORS,
+    PAGE_EXTRACTORS,
+    TITLES,
+    bestRendition,
+    extractorFields,
+    firstText,
+    getExtension,
+    resizeUrl,
+)
+from .store import ItemStore, itemDigest, itemKey
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Refresh statuses (feed.py and worker exit codes) #
+STATUS_OK = 0
+STATUS_ERROR = 1
+STATUS_TIMEOUT = 2
+# Another process held the folder lock, nothing was refreshed #
+STATUS_SKIPPED = 3
+# refresh() result for a folder another process is refreshing #
+SKIPPED = "skipped"
+
+
+class FeedEngine:
+    # wait: when another process is refreshing the same folder, wait for its
+    # feed.xml instead of returning right away
+    # client / blockedWords: replacements for the network ones (feedengine.bench)
+    def __init__(self, root=ROOT, wait=False, client=None, blockedWords=None):
+        self.root = root
+        self.wait = wait
+        self.client = client or FetchClient()
+        self.blockedWords = blockedWords or blocked.BlockedWordsProvider()
+        self.images = ImageDownloader(
+            self.client, ImageCache(os.path.join(root, "cache", "images"))
+        )
+        self.clusters = ClusterIndex()
+        self.dateParsers = collections.defaultdict(dates.PubDateParser)
+        self.store = ItemStore(os.path.join(root, "cache", "items.sqlite3"))
+        self.matcher = None
+        self.matcherKey = ""
+        self.matcherLock = None
+
+    async def __aenter__(self):
+        await self.client.__aenter__()
+        self.store.open()
+        self.matcherLock = asyncio.Lock()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.__aexit__(*exc)
+        self.images.close()
+        self.store.close()
+
+    # Get blocked words matcher, rebuilt only when the word list changes #
+    async def getMatcher(self):
+        async with self.matcherLock:
+            words = await self.blockedWords.get(self.client)
+            if self.matcher is None or self.blockedWords.key != self.matcherKey:
+                self.matcher = blocked.compileBlockedWords(words)
+                self.matcherKey = self.blockedWords.key
+        return self.matcher
+
+    # Checks that only depend on the item and the rules: blocked words and
+    # description length. Their verdict is kept in the item store.
+    def checkItem(self, source, item, matcher):
+        name = source["name"]
+        title = firstText(item.get("title"))
+        addItem = True
+        for field in source["block_fields"]:
+            for word in blocked.findBlocked(matcher, firstText(item.get(field))):
+                logging.info("{} | Blocked word found: {} | {}".format(name, word, title))
+                addItem = False
+        if source["min_description"] is not None:
+            description = firstText(item.get("description"))
+            if len(description) < source["min_description"]:
+                logging.info(
+                    "{} | Description len < {}: {} | {}".format(
+                        name, source["min_description"], description, title
+                    )
+                )
+                addItem = False
+        return addItem
+
+    # Checks that depend on the run: pubDate age and duplicates #
+    def checkRun(self, source, item, entry, seen, nowtime):
+        name = source["name"]
+        title = firstText(item.get("title"))
+        if source["max_age"] is not None and nowtime - entry["pubDate"] > source["max_age"]:
+            logging.info("{} | pubDate too old: {} | {}".format(name, entry["pubDate"], title))
+            return False
+        if source["dedupe"]:
+            duplicate = seen.find(item)
+            if duplicate is not None:
+                logging.info("{} | News already in doc ({}): {}".format(name, duplicate, title))
+                return False
+        return True
+
+    # Image url of an item: the best rendition found by the source
+    # extractors in order, the first one finding any wins. Page extractors
+    # fetch the item link. Returns (url or None, retry), retry when a page
+    # could not be read for now, so the verdict is not worth keeping.
+    async def findImage(self, source, item):
+        retry = False
+        for name in source["image"]:
+            if name in PAGE_EXTRACTORS:
+                link = firstText(item.get("link"))
+                if not link:
+                    continue
+                try:
+                    page = await fetch.getPage(self.client, link, source)
+                except fetch.PageError as e:
+                    logging.warning(
+                        "{} | Failed to get page {}: {}".format(source["name"], link, e)
+                    )
+                    retry = retry or e.retry
+                    continue
+                renditions = [
+                    (urljoin(link, url), width, height)
+                    for url, width, height in PAGE_EXTRACTORS[name](page)
+                ]
+            else:
+                renditions = EXTRACTORS[name](item)
+            if renditions:
+                return bestRendition(renditions, source["image_size"]), retry
+        return None, retry
+
+    # Build the record of an accepted item without its position:
+    # ({"record", "image" (url or None), "ext"}, retry), the record is None
+    # when the item has no usable image (see findImage for retry)
+    async def buildItem(self, source, item, publisher):
+        imageUrl = None
+        ext = None
+        retry = False
+        if source["image"] is not None:
+            imageUrl, retry = await self.findImage(source, item)
+            if imageUrl is None:
+                if source["placeholder"] is None:
+                    return None, retry
+            else:
+                if source["strip_query"]:
+                    imageUrl = imageUrl.split("?")[0]
+                imageUrl = resizeUrl(imageUrl, source["image_size"])
+                ext = getExtension(imageUrl)
+                if source["extensions"] is not None and ext not in source["extensions"]:
+                    return None, retry
+        record = {
+            "title": TITLES[source["title"]](item, publisher),
+            "description": DESCRIPTIONS[source["description"]](item),
+        }
+        for field in source["fields"]:
+            record[field] = firstText(item.get(field))
+        return {"record": record, "image": imageUrl, "ext": ext}, retry
+
+    # Check and build an item, the result is what the item store keeps #
+    async def processItem(self, source, item, publisher, matcher, key, digest, rules):
+        accepted = self.checkItem(source, item, matcher)
+        entry = {
+            "key": key,
+            "digest": digest,
+            "rules": rules,
+            "accepted": accepted,
+            "built": None,
+            "pubDate": None,
+            "story": None,
+            "retry": False,
+        }
+        if not accepted:
+            return entry
+        if source["max_age"] is not None:
+            try:
+                entry["pubDate"] = self.dateParsers[source["name"]].parse(
+                    firstText(item.get("pubDate"))
+                )
+            except ValueError as e:
+                logging.info(
+                    "{} | {} | {}".format(source["name"], e, firstText(item.get("title")))
+                )
+                entry["accepted"] = False
+                return entry
+        entry["built"], entry["retry"] = await self.buildItem(source, item, publisher)
+        if entry["built"] is not None:
+            entry["story"] = cluster.itemHash(item)
+        return entry
+
+    # feed.xml record at position index, with its (url, linkfoto) download #
+    def placeItem(self, source, built, index):
+        record = dict(built["record"])
+        record["linkfoto"] = None
+        image = None
+        if source["image"] is not None:
+            if built["image"] is None:
+                record["linkfoto"] = source["placeholder"]
+            else:
+                record["linkfoto"] = "./images/{}.{}".format(index, built["ext"])
+                image = (built["image"], record["linkfoto"])
+        return record, image
+
+    # Settings and blocked words an item verdict depends on #
+    def rulesKey(self, source):
+        key = {
+            "words": self.matcherKey if source["block_fields"] else "",
+            "source": source,
+            "dates": dates.PARSER_VERSION,
+            "cluster": cluster.HASH_VERSION,
+        }
+        return hashlib.sha1(
+            json.dumps(key, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+    # The feed is unchanged: index its written stories again (restarted
+    # daemon, stories past the cluster window). True when another source
+    # now has one of them in a way that drops it, the feed is rebuilt #
+    def reindexStories(self, source, placed):
+        name = source["name"]
+        mode = source["near_duplicates"]
+        self.clusters.dropSource(name)
+        if mode is None or not placed:
+            return False
+        stored = self.store.load(name)
+        for key, title in placed:
+            entry = stored.get(key)
+            if entry is None or entry["built"] is None:
+                continue
+            record, _ = self.placeItem(source, entry["built"], 0)
+            score = cluster.variantScore(record, source["placeholder"])
+            story = self.clusters.find(entry["story"], name, mode)
+            if story is not None and (
+                mode == "suppress" or (mode == "best" and story["score"] > score)
+            ):
+                logging.info(
+                    "{} | Same story in {}, rebuilding: {} | {}".format(
+                        name, story["source"], story["title"], title
+                    )
+                )
+                self.clusters.dropSource(name)
+                return True
+            self.clusters.add(
+                entry["story"],
+                name,
+                mode,
+                title,
+                score,
+                story["cluster"] if story is not None else None,
+            )
+        return False
+
+    # Refresh one source folder unless another process already is #
+    async def refresh(self, source):
+        name = source["name"]
+        lock = FileLock(os.path.join(self.root, name, LOCK_FILE))
+        if not lock.acquire():
+            if not self.wait:
+                logging.info("{} | Refresh already running, skipping".format(name))
+                return SKIPPED
+            logging.info("{} | Refresh already running, waiting".format(name))
+            while lock.held():
+                await asyncio.sleep(0.2)
+            return None
+        try:
+            return await self.update(source)
+        finally:
+            lock.release()
+
+    # Same feed bodies, blocked words and settings give the same feed.xml #
+    def fingerprint(self, source, responses):
+        key = {
+            "hashes": [response["validators"].get("hash") for _, _, response in responses],
+            "words": self.matcherKey if source["block_fields"] else "",
+            "source": source,
+        }
+        return hashlib.sha1(
+            json.dumps(key, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+    # Fetch, filter, build, write and download one source folder #
+    async def update(self, source):
+        name = source["name"]
+        folder = os.path.join(self.root, name)
+        nowtime = time.time()
+        logging.info("{} | Start time main: {}".format(name, time.ctime(nowtime)))
+        matcher = await self.getMatcher() if source["block_fields"] else None
+        state = fetch.loadState(folder)
+        # Conditional fetch of every url #
+        responses = []
+        for url, publisher in source["urls"]:
+            response = await fetch.getFeed(
+                self.client, url, source, state["urls"].get(url)
+            )
+            if response is not None:
+                responses.append((url, publisher, response))
+        # Keep the previous feed.xml when nothing could be fetched #
+        if not responses:
+            raise RuntimeError("No feed fetched for {}".format(name))
+        complete = len(responses) == len(source["urls"])
+        fingerprint = self.fingerprint(source, responses)
+        # Nothing changed since the last complete build, skip everything #
+        output = os.path.join(folder, source["output"])
+        if (
+            complete
+            and not any(response["changed"] for _, _, response in responses)
+            and state.get("fingerprint") == fingerprint
+            and nowtime < (state.get("valid_until") or float("inf"))
+            and os.path.exists(output)
+            and not self.reindexStories(source, state.get("stories") or [])
+        ):
+            # Touch feed.xml so index.php sees it as fresh #
+            os.utime(output)
+            logging.info("{} | Feed unchanged, skipping".format(name))
+            return None
+        # A 304 url needs its body again when another url changed #
+        for index, (url, publisher, response) in enumerate(responses):
+            if response["content"] is None:
+                response = await fetch.getFeed(self.client, url, source)
+                if response is None:
+                    raise RuntimeError("Failed to refetch {}".format(url))
+                responses[index] = (url, publisher, response)
+        items = []
+        images = []
+        expiries = []
+        seen = SeenIndex()
+        self.clusters.dropSource(name)
+        stored = self.store.load(name)
+        rules = self.rulesKey(source)
+        changed = []
+        reused = []
+        retries = 0
+        placed = []
+        channel = {}
+        limit = source["max_items"]
+        skip = fetch.HEAVY_FIELDS - extractorFields(source["image"])
+        for url, publisher, response in responses:
+            if limit is not None and len(items) >= limit:
+                break
+            for item in fetch.iterItems(
+                response["content"], source["recover"], channel, skip
+            ):
+                # Only new or changed items are checked and built again #
+                digest = itemDigest(item, publisher)
+                key = itemKey(item, digest, publisher)
+                entry = stored.get(key)
+                if entry is not None and entry["digest"] == digest and entry["rules"] == rules:
+                    reused.append(key)
+                else:
+                    entry = await self.processItem(
+                        source, item, publisher, matcher, key, digest, rules
+                    )
+                    # A page that failed for now is read again next time #
+                    if entry["retry"]:
+                        retries += 1
+                    else:
+                        changed.append(entry)
+                if not entry["accepted"] or entry["built"] is None:
+                    continue
+                if not self.checkRun(source, item, entry, seen, nowtime):
+                    continue
+                record, image = self.placeItem(source, entry["built"], len(items))
+                # Same story already published by another source #
+                mode = source["near_duplicates"]
+                if mode is not None:
+                    story = self.clusters.find(entry["story"], name, mode)
+                    score = cluster.variantScore(record, source["placeholder"])
+                    if story is not None and (
+                        mode == "suppress" or (mode == "best" and story["score"] > score)
+                    ):
+                        logging.info(
+                            "{} | Same story in {}: {} | {}".format(
+                                name, story["source"], story["title"], firstText(item.get("title"))
+                            )
+                        )
+                        continue
+                    storyId = self.clusters.add(
+                        entry["story"],
+                        name,
+                        mode,
+                        firstText(item.get("title")),
+                        score,
+                        story["cluster"] if story is not None else None,
+                    )
+                    if mode == "tag":
+                        record["cluster"] = storyId
+                items.append(record)
+                placed.append((entry["key"], firstText(item.get("title"))))
+                if source["dedupe"]:
+                    seen.add(item)
+                if source["max_age"] is not None:
+                    expiries.append(entry["pubDate"] + source["max_age"])
+                if image is not None:
+                    images.append(image)
+                # Log title, description and image #
+                logging.info(
+                    "{} | Title: {} | Description: {} | Image: {}".format(
+                        name, record["title"], record["description"], record["linkfoto"]
+                    )
+                )
+                # Stop parsing once the feed is full #
+                if limit is not None and len(items) >= limit:
+                    break
+        self.store.save(name, changed, reused)
+        logging.info(
+            "{} | Items checked: {} new or changed, {} from the store, {} to retry".format(
+                name, len(changed), len(reused), retries
+            )
+        )
+        channelInfo = None
+        if source["layout"] == "channel":
+            channelInfo = {key: firstText(value) for key, value in channel.items()}
+        # Save feed.xml UTF8 #
+        stamp = time.ctime(nowtime) if source["layout"] == "player" else None
+        writer.writeFeed(
+            output,
+            items,
+            layout=source["layout"],
+            stamp=stamp,
+            channelInfo=channelInfo,
+            compact=source["compact"],
+        )
+        logging.info("{} | Done time main: {}".format(name, time.ctime(time.time())))
+        failed = await self.downloadImages(source, images)
+        # Long running engines (daemon) never close, prune from here #
+        await self.images.prune()
+        # Remember validators, and the fingerprint only for complete builds
+        # (every url, image and page) #
+        fetch.saveState(
+            folder,
+            {
+                "urls": {url: response["validators"] for url, _, response in responses},
+                "fingerprint": fingerprint if complete and not failed and not retries else None,
+                "valid_until": min(expiries) if expiries else None,
+                "stories": placed if source["near_duplicates"] is not None else [],
+            },
+        )
+        return len(items)
+
+    # Download images to ./images/, normalized to the source image_size and
+    # image_bytes. Returns the number of failed downloads
+    async def downloadImages(self, source, images):
+        if not images:
+            return 0
+        name = source["name"]
+        folder = os.path.join(self.root, name)
+        os.makedirs(os.path.join(folder, "images"), exist_ok=True)
+        logging.info("{} | Start time downloader: {}".format(name, time.ctime(time.time())))
+        started = time.monotonic()
+        reports = await self.images.run(source, folder, images)
+        failed = sum(1 for report in reports if report["error"] is not None)
+        logging.info(
+            "{} | Done time downloader: {} | {} images, {} bytes, {} failed in {}s".format(
+                name,
+                time.ctime(time.time()),
+                len(reports),
+                sum(report["bytes"] for report in reports),
+                failed,
+                round(time.monotonic() - started, 3),
+            )
+        )
+        return failed
+
+    # Refresh a list of folders in order, all of them when empty #
+    async def run(self, names=None):
+        results = {}
+        for source in registry.getSources(names):
+            try:
+                done = await self.refresh(source)
+                results[source["name"]] = STATUS_SKIPPED if done is SKIPPED else STATUS_OK
+            except Exception as e:
+                logging.error("{} | ERROR {}".format(source["name"], e))
+                results[source["name"]] = STATUS_ERROR
+        return results
+
+
+async def runEngine(names=None, wait=False):
+    async with FeedEngine(wait=wait) as engine:
+        return await engine.run(names)
+
+
+# Refresh folders in one warm process, returns {folder: status} #
+def runSources(names=None, wait=False):
+    return asyncio.run(runEngine(names, wait))
+
+
+# Setup logging basic conf #
+def setupLogging(filename):
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(message)s",
+        filename=filename,
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+
+# Entry point for the per folder feed.py scripts #
+def runFolder(folder):
+    folder = os.path.abspath(folder)
+    name = os.path.relpath(folder, ROOT).replace(os.sep, "/")
+    setupLogging(os.path.join(folder, "feed.log"))
+    # Another feed.py refreshing the folder is no failure for this one #
+    return {
+        key: STATUS_OK if status == STATUS_SKIPPED else status
+        for key, status in runSources([name]).items()
+    }
@@ -0,0 +1,197 @@
+# Python 3.11.1
+# Feed download and parsing
+
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+
+import aiohttp
+import lxml.etree as ET
+
+USER_AGENT = "Mozilla/5.0 (Windows; U; Windows NT 5.1; en-US; rv:1.9.0.7) Gecko/2009021910 Firefox/3.0.7"
+
+# Per folder fetch state: validators per url and the last build fingerprint #
+STATE_FILE = "feed.cache.json"
+
+
+# Item fields no source reads, skipped while building items (WordPress
+# content:encoded holds the whole article) #
+HEAVY_FIELDS = frozenset(("content:encoded",))
+# Article pages are only read this far, og:image lives in the <head> #
+PAGE_BYTES = 256 * 1024
+PAGE_TIMEOUT = aiohttp.ClientTimeout(total=15, sock_connect=10)
+# Page answers worth asking again on the next refresh #
+PAGE_RETRY_STATUS = frozenset((408, 429, 500, 502, 503, 504))
+# Channel fields kept for the "channel" layout #
+CHANNEL_FIELDS = ("title", "link", "description")
+
+
+# Name as written in the document ("media:content"), like xmltodict #
+def qualifiedName(element, name):
+    qname = ET.QName(name)
+    if qname.namespace is None:
+        return qname.localname
+    prefix = element.prefix if name == element.tag else None
+    if prefix is None:
+        for key, value in element.nsmap.items():
+            if value == qname.namespace and key:
+                prefix = key
+                break
+    return "{}:{}".format(prefix, qname.localname) if prefix else qname.localname
+
+
+# Convert an element to the value xmltodict would give:
+# None when empty, the text when it has no attributes or children,
+# else a dict of "@attribute", child names and "#text"
+def elementValue(element, skip=()):
+    text = (element.text or "").strip() or None
+    if not len(element) and not element.attrib:
+        return text
+    value = {}
+    for name, attribute in element.attrib.items():
+        value["@" + qualifiedName(element, name)] = attribute
+    for child in element:
+        if not isinstance(child.tag, str):
+            continue
+        name = qualifiedName(child, child.tag)
+        if name in skip:
+            continue
+        childValue = elementValue(child)
+        if name not in value:
+            value[name] = childValue
+        elif isinstance(value[name], list):
+            value[name].append(childValue)
+        else:
+            value[name] = [value[name], childValue]
+    if text is not None:
+        value["#text"] = text
+    return value
+
+
+def readChannel(channelElement, channel):
+    for field in CHANNEL_FIELDS:
+        child = channelElement.find(field)
+        channel[field] = elementValue(child) if child is not None else None
+
+
+# Stream the <item>s of a feed one at a time, as xmltodict shaped dicts
+# Processed items are freed right away and parsing stops as soon as the
+# caller stops iterating. `channel` (a dict) gets the channel fields.
+def iterItems(content, recover=False, channel=None, skip=HEAVY_FIELDS):
+    events = ET.iterparse(
+        io.BytesIO(content.strip()),
+        events=("end",),
+        tag="item",
+        recover=recover,
+        resolve_entities=False,
+        no_network=True,
+    )
+    for _, element in events:
+        parent = element.getparent()
+        if channel is not None and not channel and parent is not None:
+            readChannel(parent, channel)
+        yield elementValue(element, skip)
+        # Free this item and every sibling parsed before it #
+        element.clear(keep_tail=True)
+        while parent is not None and element.getprevious() is not None:
+            del parent[0]
+    # Feed without items: the channel is complete now #
+    if channel is not None and not channel:
+        root = events.root
+        channelElement = root.find("channel") if root is not None else None
+        if channelElement is not None:
+            readChannel(channelElement, channel)
+
+
+def loadState(folder):
+    try:
+        with open(os.path.join(folder, STATE_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"urls": {}}
+
+
+# Only called while holding the folder lock, so no other writer exists #
+def saveState(folder, state):
+    path = os.path.join(folder, STATE_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+# Get feed body from url with a conditional request
+# Returns {"content", "changed", "validators"}, content None on 304 and
+# changed False when the body hash matches the last one, None on failure
+async def getFeed(client, url, source, cached=None):
+    cached = cached or {}
+    headers = {"User-Agent": USER_AGENT}
+    if cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+    try:
+        async with client.get(
+            url, headers=headers, ssl=None if source["verify"] else False
+        ) as response:
+            if response.status == 304:
+                logging.info("Not modified xml from {}".format(url))
+                return {"content": None, "changed": False, "validators": cached}
+            if response.status != 200:
+                # Log error
+                logging.error("Failed to get xml from {}".format(url))
+                return None
+            content = await response.read()
+            validators = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "hash": hashlib.sha1(content).hexdigest(),
+            }
+    # Connection reset, timeout: same as an error answer for this url #
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logging.error("Failed to get xml from {}: {}".format(url, str(e) or type(e).__name__))
+        return None
+    # Log success
+    logging.info("Success on getting xml from {}".format(url))
+    return {
+        "content": content,
+        "changed": validators["hash"] != cached.get("hash"),
+        "validators": validators,
+    }
+
+
+class PageError(Exception):
+    def __init__(self, message, retry=False):
+        super().__init__(message)
+        self.retry = retry
+
+
+# Get the start of an article page as text (up to its </head>). Raises
+# PageError, with retry set when the failure may pass (timeout, 5xx).
+# Only used for items whose feed has no image.
+async def getPage(client, url, source):
+    try:
+        async with client.get(
+            url,
+            headers={"User-Agent": USER_AGENT},
+            ssl=None if source["verify"] else False,
+            timeout=PAGE_TIMEOUT,
+        ) as response:
+            if response.status != 200:
+                raise PageError(
+                    "HTTP {}".format(response.status), response.status in PAGE_RETRY_STATUS
+                )
+            body = b""
+            async for chunk in response.content.iter_chunked(16384):
+                body += chunk
+                if len(body) >= PAGE_BYTES or b"</head>" in body[-16400:].lower():
+                    break
+            charset = response.charset or "utf-8"
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise PageError(str(e) or type(e).__name__, retry=True)
+    try:
+        return body[:PAGE_BYTES].decode(charset, "replace")
+    except LookupError:
+        return body[:PAGE_BYTES].decode("utf-8", "replace")
@@ -0,0 +1,397 @@
+# Python 3.11.1
+# Offline fixtures: feed payloads and images for every source, served by
+# ReplayClient instead of the network (feedengine.bench)
+#
+# bench/fixtures/recorded/    captured from the real urls (--record), kept
+#                             in git
+# bench/fixtures/generated/   synthetic feeds shaped like each source (image
+#                             extractor, description html, dates, blocked
+#                             words, stories shared between feeds), made on
+#                             first use for urls nothing was recorded for
+#
+# Each folder has a manifest.json: {"created": epoch, "urls": {url: {"file",
+# "type", "salt"}}}. Recorded urls win over generated ones. Salted images
+# share a few base files and get the url as a JPEG comment, so every url
+# still has its own body (the image cache dedupes identical ones).
+
+import asyncio
+import contextlib
+import email.utils
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import shutil
+import struct
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+from xml.sax.saxutils import escape, quoteattr
+
+from PIL import Image, ImageFilter
+
+from . import blocked, fetch
+from .client import FetchClient
+from .engine import ROOT
+from .rules import EXTRACTORS, bestRendition, extractorFields, getExtension, resizeUrl
+
+FIXTURES = os.path.join(ROOT, "bench", "fixtures")
+RECORDED = os.path.join(FIXTURES, "recorded")
+GENERATED = os.path.join(FIXTURES, "generated")
+MANIFEST = "manifest.json"
+# Items per generated feed #
+GENERATED_ITEMS = 40
+# Base images per size, every item url gets one of them salted #
+BASE_IMAGES = 6
+BASE_SIZES = {"large": (2400, 1600), "small": (800, 533)}
+# Images recorded per feed url #
+RECORDED_IMAGES = 20
+# Brazilian feeds publish in -03:00 #
+FEED_ZONE = timezone(timedelta(hours=-3))
+
+VOCABULARY = (
+    "mercado safra soja milho boi gordo exportação dólar juros inflação bolsa "
+    "ibovespa governo secretaria produtores preço alta queda recorde colheita "
+    "chuva seca clima fazenda cooperativa crédito rural banco central economia "
+    "empresas investimento ações dividendos tributária reforma estados região "
+    "sul norte nordeste centro-oeste café açúcar etanol algodão trigo arroz "
+    "feijão carne frango suínos leite fertilizantes diesel frete porto logística "
+    "tecnologia inovação startup energia solar sustentabilidade carbono floresta "
+    "amazônia cerrado pesquisa embrapa previsão semana mês trimestre ano"
+).split()
+
+
+def sha1(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def loadManifest(folder):
+    try:
+        with open(os.path.join(folder, MANIFEST), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"created": None, "urls": {}}
+
+
+def saveManifest(folder, manifest):
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def writeFixture(folder, name, data):
+    path = os.path.join(folder, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+# Every fixture url: {url: {"path", "type", "salt", "created"}} #
+def loadFixtures(folders=(GENERATED, RECORDED)):
+    fixtures = {
+        blocked.BLOCKED_WORDS_URL: {
+            "path": blocked.BLOCKED_WORDS_FILE,
+            "type": "application/json",
+            "salt": False,
+            "created": None,
+        }
+    }
+    # Later folders win #
+    for folder in folders:
+        manifest = loadManifest(folder)
+        for url, entry in manifest["urls"].items():
+            fixtures[url] = {
+                "path": os.path.join(folder, entry["file"]),
+                "type": entry["type"],
+                "salt": entry.get("salt", False),
+                "created": manifest["created"],
+            }
+    return fixtures
+
+
+# Same pixels, different bytes: a JPEG comment segment right after SOI,
+# other formats get the url after their end #
+def saltImage(data, url):
+    comment = url.encode("utf-8")[:60000]
+    if not data.startswith(b"\xff\xd8"):
+        return data + comment
+    return data[:2] + b"\xff\xfe" + struct.pack(">H", len(comment) + 2) + comment + data[2:]
+
+
+## Replay client ##
+
+
+class ReplayStream:
+    def __init__(self, body):
+        self.body = body
+        self.offset = 0
+
+    async def read(self, size=-1):
+        end = len(self.body) if size < 0 else self.offset + size
+        chunk = self.body[self.offset : end]
+        self.offset += len(chunk)
+        return chunk
+
+    async def iter_chunked(self, size):
+        while self.offset < len(self.body):
+            yield await self.read(size)
+
+
+class ReplayResponse:
+    def __init__(self, status, body=b"", contentType="application/octet-stream"):
+        self.status = status
+        self.body = body
+        self.content_type = contentType
+        self.content_length = len(body)
+        self.charset = "utf-8" if contentType.startswith(("text/", "application/")) else None
+        self.headers = {"Content-Type": contentType}
+        if status == 200:
+            self.headers["ETag"] = '"{}"'.format(hashlib.sha1(body).hexdigest())
+        self.content = ReplayStream(body)
+
+    async def read(self):
+        return self.body
+
+    async def json(self, content_type=None):
+        return json.loads(self.body)
+
+
+# Same usage as FetchClient, answers from fixtures (404 for other urls) #
+class ReplayClient:
+    def __init__(self, fixtures):
+        self.fixtures = fixtures
+        self.bodies = {}
+        self.requests = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    def body(self, url):
+        if url not in self.bodies:
+            entry = self.fixtures[url]
+            with open(entry["path"], "rb") as f:
+                data = f.read()
+            self.bodies[url] = saltImage(data, url) if entry["salt"] else data
+        return self.bodies[url]
+
+    @contextlib.asynccontextmanager
+    async def get(self, url, **kwargs):
+        self.requests += 1
+        if url not in self.fixtures:
+            yield ReplayResponse(404)
+            return
+        yield ReplayResponse(200, self.body(url), self.fixtures[url]["type"])
+
+
+## Generated fixtures ##
+
+
+def baseImage(rng, size):
+    # Smooth random blobs upscaled: compresses like a photo, unlike noise #
+    small = Image.frombytes("RGB", (24, 16), rng.randbytes(24 * 16 * 3))
+    image = small.resize(size, Image.BICUBIC).filter(ImageFilter.DETAIL)
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=90)
+    return output.getvalue()
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+def pubDate(rng, now, maxAge):
+    age = rng.uniform(0, 1.5 * (maxAge or 60 * 60 * 24 * 3))
+    return email.utils.format_datetime(datetime.fromtimestamp(now - age, FEED_ZONE))
+
+
+# Image markup of one item for the first extractor of a source #
+def imageMarkup(extractor, large, small):
+    if extractor == "media:content":
+        return (
+            '<media:content url={} medium="image" width="800" height="533"/>'
+            '<media:content url={} medium="image" width="2400" height="1600"/>'
+        ).format(quoteattr(small), quoteattr(large))
+    if extractor == "enclosure":
+        return '<enclosure url={} type="image/jpeg" length="0"/>'.format(quoteattr(large))
+    if extractor == "itunes:image":
+        return "<itunes:image href={}/>".format(quoteattr(large))
+    if extractor == "image":
+        return "<image><url>{}</url></image>".format(escape(large))
+    if extractor == "linkfoto":
+        return "<linkfoto>{}</linkfoto>".format(escape(large))
+    return ""
+
+
+def imgTag(large, small):
+    return '<img src="{0}" width="800" height="533" srcset="{0} 800w, {1} 2400w" />'.format(
+        small, large
+    )
+
+
+def syntheticItem(rng, source, url, index, now, words, stories):
+    host = urlsplit(url).hostname
+    extractor = (source["image"] or (None,))[0]
+    title = sentence(rng, rng.randint(6, 12)).capitalize()
+    # The same story in several feeds, reworded a little #
+    if rng.random() < 0.25:
+        title = rng.choice(stories) + " " + rng.choice(VOCABULARY)
+    if words and rng.random() < 0.05:
+        title += " " + rng.choice(words)
+    token = sha1("{}|{}".format(url, index))[:10]
+    large = "https://{}/bench/{}-2400x1600.jpg".format(host, token)
+    small = "https://{}/bench/{}-800x533.jpg".format(host, token)
+    # Some items have no image (placeholder / skipped) #
+    hasImage = rng.random() > 0.1
+    paragraphs = [sentence(rng, rng.randint(20, 60)) for _ in range(rng.randint(1, 4))]
+    if rng.random() < 0.05:
+        paragraphs = [sentence(rng, 3)]
+    html = "".join("<p>{} &amp;amp; {}<br />{}</p>".format(p, rng.choice(VOCABULARY), p[:40]) for p in paragraphs)
+    if hasImage and extractor in ("description:img", "content:img"):
+        html = "<p>{}</p>".format(imgTag(large, small)) + html
+    parts = [
+        "<title>{}</title>".format(escape(title)),
+        "<link>https://{}/noticia/{}</link>".format(host, token),
+        '<guid isPermaLink="false">{}</guid>'.format(token),
+        "<category>{}</category>".format(escape(rng.choice(VOCABULARY).capitalize())),
+        "<pubDate>{}</pubDate>".format(pubDate(rng, now, source["max_age"])),
+        "<description>{}</description>".format(escape(html)),
+    ]
+    # WordPress feeds carry the whole article #
+    if "feed" in urlsplit(url).path:
+        article = "".join(
+            "<p>{}</p>".format(sentence(rng, rng.randint(40, 120))) for _ in range(12)
+        )
+        if hasImage:
+            article = imgTag(large, small) + article
+        parts.append("<content:encoded><![CDATA[{}]]></content:encoded>".format(article))
+    if hasImage:
+        parts.append(imageMarkup(extractor, large, small))
+    images = [large, small] if hasImage and extractor is not None else []
+    return "<item>{}</item>".format("".join(parts)), images
+
+
+def syntheticFeed(source, url, now, words, stories, items=GENERATED_ITEMS):
+    rng = random.Random(url)
+    images = []
+    body = []
+    for index in range(items):
+        item, itemImages = syntheticItem(rng, source, url, index, now, words, stories)
+        body.append(item)
+        images += itemImages
+    feed = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/" '
+        'xmlns:content="http://purl.org/rss/1.0/modules/content/" '
+        'xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd">'
+        "<channel><title>{0}</title><link>https://{0}/</link>"
+        "<description>{0}</description>{1}</channel></rss>"
+    ).format(urlsplit(url).hostname, "".join(body))
+    return feed.encode("utf-8"), images
+
+
+# Generate fixtures for every source url nothing was recorded or generated
+# for, returns the number of feeds written
+def generateFixtures(sources, folder=GENERATED):
+    known = set(loadManifest(RECORDED)["urls"])
+    manifest = loadManifest(folder)
+    known.update(manifest["urls"])
+    rng = random.Random(0)
+    now = time.time()
+    words = blocked.BlockedWordsProvider().readLocal()
+    stories = [sentence(rng, 8).capitalize() for _ in range(30)]
+    written = 0
+    for source in sources:
+        for url, _ in source["urls"]:
+            if url in known:
+                continue
+            known.add(url)
+            if not manifest["urls"]:
+                for kind, size in BASE_SIZES.items():
+                    for index in range(BASE_IMAGES):
+                        name = "images/{}-{}.jpg".format(kind, index)
+                        writeFixture(folder, name, baseImage(rng, size))
+            feed, images = syntheticFeed(source, url, now, words, stories)
+            name = "{}/{}.xml".format(source["name"], sha1(url)[:12])
+            writeFixture(folder, name, feed)
+            manifest["urls"][url] = {"file": name, "type": "application/rss+xml"}
+            for image in images:
+                kind = "large" if "2400x" in image else "small"
+                manifest["urls"][image] = {
+                    "file": "images/{}-{}.jpg".format(kind, int(sha1(image), 16) % BASE_IMAGES),
+                    "type": "image/jpeg",
+                    "salt": True,
+                }
+            written += 1
+    if written:
+        manifest["created"] = manifest["created"] or now
+        saveManifest(folder, manifest)
+    return written
+
+
+def removeGenerated(folder=GENERATED):
+    shutil.rmtree(folder, ignore_errors=True)
+
+
+## Recorded fixtures ##
+
+
+# Image urls the engine would download from a feed body #
+def feedImages(source, content, limit=RECORDED_IMAGES):
+    urls = []
+    skip = fetch.HEAVY_FIELDS - extractorFields(source["image"])
+    for item in fetch.iterItems(content, source["recover"], None, skip):
+        for name in source["image"] or ():
+            if name not in EXTRACTORS:
+                continue
+            url = bestRendition(EXTRACTORS[name](item), source["image_size"])
+            if url:
+                if source["strip_query"]:
+                    url = url.split("?")[0]
+                urls.append(resizeUrl(url, source["image_size"]))
+                break
+        if len(urls) >= limit:
+            break
+    return urls
+
+
+# Capture the feeds of sources and their first images from the network #
+async def recordFixtures(sources, folder=RECORDED):
+    manifest = loadManifest(folder)
+    async with FetchClient() as client:
+        for source in sources:
+            for url, _ in source["urls"]:
+                response = await fetch.getFeed(client, url, source)
+                if response is None:
+                    continue
+                name = "{}/{}.xml".format(source["name"], sha1(url)[:12])
+                writeFixture(folder, name, response["content"])
+                manifest["urls"][url] = {"file": name, "type": "application/rss+xml"}
+                for image in feedImages(source, response["content"]):
+                    try:
+                        async with client.get(
+                            image, headers={"User-Agent": fetch.USER_AGENT}, ssl=False
+                        ) as imageResponse:
+                            if imageResponse.status != 200:
+                                continue
+                            body = await imageResponse.read()
+                            contentType = imageResponse.content_type
+                    except Exception as e:
+                        logging.error("Failed to record {}: {}".format(image, e))
+                        continue
+                    imageName = "images/{}.{}".format(sha1(image), getExtension(image)[:5])
+                    writeFixture(folder, imageName, body)
+                    manifest["urls"][image] = {"file": imageName, "type": contentType}
+                logging.info("Recorded {}".format(url))
+    manifest["created"] = time.time()
+    saveManifest(folder, manifest)
+
+
+def runRecord(sources):
+    return asyncio.run(recordFixtures(sources))
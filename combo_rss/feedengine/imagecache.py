@@ -0,0 +1,153 @@
+# Python 3.11.1
+# Content addressed image cache shared by every source and run
+#
+# cache/images/blobs/ab/abcdef....jpg   normalized image, named by its sha1
+# cache/images/urls/12/1234....json     per url: validators, sha1 of the
+#                                       downloaded body and one blob per
+#                                       normalization variant
+# cache/images/downloads/               bodies being downloaded
+#
+# Source folders get a hard link to the blob (a copy where links are not
+# supported), so the same story photo in g1/default, g1/economia and
+# g1/ecoagro is downloaded, normalized and stored once. Blobs are never
+# written in place, only created, so a linked ./images/N.jpg never changes
+# under a player.
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+# Skip the conditional request for urls validated within this many seconds #
+IMAGE_FRESH = 60 * 60 * 6
+# Unused metadata and unlinked blobs are removed after this many seconds #
+IMAGE_RETENTION = 60 * 60 * 24 * 7
+# Seconds between two prune passes #
+PRUNE_INTERVAL = 60 * 60 * 24
+
+
+def sha1(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+# Normalization settings a blob depends on, with the output extension #
+def variantKey(source, ext):
+    return "{}|{}|{}|{}".format(
+        source["image_size"], source["image_bytes"], source["quality"], ext
+    )
+
+
+# Write data to path through a temp file renamed over it #
+def replaceFile(path, data):
+    temp = "{}.{}.tmp".format(path, os.getpid())
+    with open(temp, "wb") as f:
+        f.write(data)
+    os.replace(temp, path)
+
+
+class ImageCache:
+    def __init__(self, root, fresh=IMAGE_FRESH, retention=IMAGE_RETENTION):
+        self.root = root
+        self.fresh = fresh
+        self.retention = retention
+
+    def urlPath(self, url):
+        key = sha1(url.encode("utf-8"))
+        return os.path.join(self.root, "urls", key[:2], key + ".json")
+
+    def blobPath(self, blob):
+        return os.path.join(self.root, "blobs", blob[:2], blob)
+
+    # Temp file an url is streamed to before it is checked, unique per url
+    # and process #
+    def downloadPath(self, url):
+        folder = os.path.join(self.root, "downloads")
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(
+            folder, "{}.{}.download".format(sha1(url.encode("utf-8")), os.getpid())
+        )
+
+    # Cached metadata of url, None when unknown #
+    def load(self, url):
+        try:
+            with open(self.urlPath(url), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def save(self, url, meta):
+        path = self.urlPath(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        replaceFile(path, json.dumps(meta).encode("utf-8"))
+
+    # Blob of a variant when it is still on disk #
+    def variant(self, meta, key):
+        blob = (meta or {}).get("variants", {}).get(key)
+        if blob is None or not os.path.exists(self.blobPath(blob)):
+            return None
+        return blob
+
+    def isFresh(self, meta):
+        return time.time() - meta.get("fetched", 0) < self.fresh
+
+    # Store a finished image file (renamed into the cache), returns its blob #
+    def store(self, filename, ext):
+        with open(filename, "rb") as f:
+            blob = "{}.{}".format(sha1(f.read()), ext)
+        path = self.blobPath(blob)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.remove(filename)
+        else:
+            os.replace(filename, path)
+        return blob
+
+    # Point target at blob: hard link when possible, copy otherwise #
+    def link(self, blob, target):
+        path = self.blobPath(blob)
+        # Already linked by a previous run (rename would be a no-op) #
+        if os.path.exists(target) and os.path.samefile(path, target):
+            os.utime(path)
+            return os.path.getsize(target)
+        temp = "{}.{}.tmp".format(target, os.getpid())
+        if os.path.exists(temp):
+            os.remove(temp)
+        try:
+            os.link(path, temp)
+        except OSError:
+            shutil.copyfile(path, temp)
+        os.replace(temp, target)
+        # Keep used blobs out of prune #
+        os.utime(path)
+        return os.path.getsize(target)
+
+    # Remove metadata not used and blobs not linked for `retention` seconds #
+    def prune(self):
+        marker = os.path.join(self.root, "pruned")
+        now = time.time()
+        try:
+            if now - os.path.getmtime(marker) < PRUNE_INTERVAL:
+                return 0
+        except FileNotFoundError:
+            pass
+        os.makedirs(self.root, exist_ok=True)
+        with open(marker, "w"):
+            pass
+        removed = 0
+        for kind in ("urls", "blobs", "downloads"):
+            for folder, _, files in os.walk(os.path.join(self.root, kind)):
+                for name in files:
+                    path = os.path.join(folder, name)
+                    try:
+                        stat = os.stat(path)
+                        if now - stat.st_mtime < self.retention:
+                            continue
+                        # Still linked from a source folder #
+                        if kind == "blobs" and stat.st_nlink > 1:
+                            continue
+                        os.remove(path)
+                        removed += 1
+                    except FileNotFoundError:
+                        continue
+        return removed
@@ -0,0 +1,392 @@
+# Python 3.11.1
+# Image stage: concurrent downloads shared by every source in the process
+#
+# Images go through the content addressed cache (imagecache.py): an url
+# already downloaded and normalized is only revalidated, then hard linked
+# into the source folder.
+#
+# Downloads go through the engine FetchClient, so the per host limits
+# (client.HOST_LIMITS) apply to images too, plus a global cap on images in
+# flight. Every image gets its own timeout and a few retries on network
+# errors and 5xx / 429 answers.
+#
+# The event loop only does network I/O: files are written by a thread pool
+# and recompression (JPEG decode + encode) runs in a process pool, so a big
+# image never stalls the other downloads and uses every core.
+
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import aiohttp
+from PIL import Image, ImageOps
+
+from .imagecache import variantKey
+
+# Images downloaded at the same time, all sources together #
+IMAGE_PARALLEL = 16
+# Per image timeout, much shorter than a feed's #
+IMAGE_TIMEOUT = aiohttp.ClientTimeout(total=20, sock_connect=10)
+# Extra attempts after a failure, waiting RETRY_BACKOFF * 2 ** attempt #
+IMAGE_RETRIES = 2
+RETRY_BACKOFF = 0.5
+# Answers worth retrying #
+RETRY_STATUS = frozenset((429, 500, 502, 503, 504))
+# Highest JPEG quality tried when fitting an image in its byte budget #
+MAX_QUALITY = 85
+# EXIF orientations that swap width and height #
+TRANSPOSED = frozenset((5, 6, 7, 8))
+# Recompression processes, started on the first image that needs one #
+IMAGE_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+# Threads writing image files #
+WRITE_THREADS = 4
+# Downloads over this size are aborted, announced or not #
+MAX_DOWNLOAD_BYTES = 15000000
+CHUNK_SIZE = 65536
+# Content types accepted besides image/*, the magic bytes decide #
+UNTYPED = frozenset(("application/octet-stream", "binary/octet-stream"))
+# File signatures of the image formats players can show #
+MAGIC = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"GIF87a", b"GIF89a", b"BM")
+MAGIC_BYTES = 12
+
+
+# Runs in the thread pool #
+def writeImage(filename, content):
+    with open(filename, "wb") as f:
+        f.write(content)
+    return len(content)
+
+
+# The first bytes of a file are an image signature #
+def isImage(head):
+    if head.startswith(MAGIC):
+        return True
+    # RIFF....WEBP and ISO media (AVIF / HEIF) #
+    return (head[:4] == b"RIFF" and head[8:12] == b"WEBP") or head[4:8] == b"ftyp"
+
+
+# Scale that makes (width, height) just cover size, never above 1 #
+def coverScale(width, height, size):
+    return min(1, max(size[0] / width, size[1] / height))
+
+
+# An image needs normalizing when it is over the byte budget or bigger than
+# the player area. Only reads the image header.
+def needsNormalize(path, size, budget):
+    if budget is not None and os.path.getsize(path) > budget:
+        return True
+    if size is None:
+        return False
+    try:
+        with Image.open(path) as img:
+            return coverScale(img.width, img.height, size) < 1
+    except (OSError, ValueError):
+        return False
+
+
+# Highest quality in [quality, MAX_QUALITY] that fits budget, else quality #
+def fitQuality(img, budget, quality):
+    def encode(value):
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=value)
+        return buffer.getvalue()
+
+    best = encode(MAX_QUALITY)
+    if budget is None or len(best) <= budget:
+        return best
+    low, high = quality, MAX_QUALITY - 1
+    best = None
+    while low <= high:
+        middle = (low + high) // 2
+        data = encode(middle)
+        if len(data) <= budget:
+            best, low = data, middle + 1
+        else:
+            high = middle - 1
+    return best if best is not None else encode(quality)
+
+
+# Runs in a worker process: read the downloaded file at path, downscale to
+# cover size, then write filename at the best quality that fits budget.
+# JPEGs are decoded at reduced scale (draft mode).
+def normalizeImage(path, filename, size, budget, quality):
+    with Image.open(path) as img:
+        if getattr(img, "is_animated", False):
+            shutil.copyfile(path, filename)
+            return os.path.getsize(filename)
+        width, height = img.size
+        displayed = (width, height)
+        if img.getexif().get(0x0112) in TRANSPOSED:
+            displayed = (height, width)
+        scale = coverScale(*displayed, size) if size is not None else 1
+        if scale < 1 and img.format == "JPEG":
+            img.draft("RGB", (round(width * scale), round(height * scale)))
+        img = ImageOps.exif_transpose(img)
+        if scale < 1:
+            img = img.resize(
+                (max(1, round(displayed[0] * scale)), max(1, round(displayed[1] * scale))),
+                Image.LANCZOS,
+            )
+        imageFormat = Image.registered_extensions().get(
+            os.path.splitext(filename)[1].lower()
+        )
+        if imageFormat == "JPEG":
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            return writeImage(filename, fitQuality(img, budget, quality))
+        img.save(filename, imageFormat, quality=quality)
+    return os.path.getsize(filename)
+
+
+class ImageError(Exception):
+    def __init__(self, message, retry=False):
+        super().__init__(message)
+        self.retry = retry
+
+
+class ImageDownloader:
+    def __init__(
+        self,
+        client,
+        cache,
+        parallel=IMAGE_PARALLEL,
+        timeout=IMAGE_TIMEOUT,
+        retries=IMAGE_RETRIES,
+        maxBytes=MAX_DOWNLOAD_BYTES,
+    ):
+        self.client = client
+        self.cache = cache
+        self.maxBytes = maxBytes
+        self.timeout = timeout
+        self.retries = retries
+        self.semaphore = asyncio.Semaphore(parallel)
+        self.threads = ThreadPoolExecutor(WRITE_THREADS, thread_name_prefix="images")
+        self.processes = None
+        self.locks = weakref.WeakValueDictionary()
+
+    def processPool(self):
+        if self.processes is None:
+            self.processes = ProcessPoolExecutor(
+                IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self.processes
+
+    def close(self):
+        self.threads.shutdown()
+        if self.processes is not None:
+            self.processes.shutdown()
+            self.processes = None
+
+    # Turn the downloaded file at path into filename off the loop:
+    # normalized in a worker process when needed, else just renamed
+    async def save(self, source, path, filename):
+        loop = asyncio.get_running_loop()
+        size, budget = source["image_size"], source["image_bytes"]
+        if await loop.run_in_executor(self.threads, needsNormalize, path, size, budget):
+            try:
+                return await loop.run_in_executor(
+                    self.processPool(),
+                    normalizeImage,
+                    path,
+                    filename,
+                    size,
+                    budget,
+                    source["quality"],
+                )
+            except Exception as e:
+                # A dead worker breaks the whole pool, start a new one next time #
+                if isinstance(e, BrokenProcessPool):
+                    self.processes = None
+                logging.error(
+                    "{} | Failed to compress {}: {}".format(source["name"], filename, e)
+                )
+        await loop.run_in_executor(self.threads, os.replace, path, filename)
+        return os.path.getsize(filename)
+
+    # One GET streamed to path, checking size, type and signature on the way
+    # Returns (status, headers, {"bytes", "raw"}), no body on 304
+    async def fetch(self, url, headers, path):
+        loop = asyncio.get_running_loop()
+        try:
+            async with self.client.get(
+                url, headers=headers, ssl=False, timeout=self.timeout
+            ) as response:
+                if response.status == 304:
+                    return response.status, response.headers, None
+                if response.status != 200:
+                    raise ImageError(
+                        "HTTP {}".format(response.status), response.status in RETRY_STATUS
+                    )
+                length = response.content_length
+                if length is not None and length > self.maxBytes:
+                    raise ImageError("Too large: {} bytes".format(length))
+                if not response.content_type.startswith("image/") and (
+                    response.content_type not in UNTYPED
+                ):
+                    raise ImageError("Not an image: {}".format(response.content_type))
+                digest = hashlib.sha1()
+                received = 0
+                head = b""
+                f = await loop.run_in_executor(self.threads, open, path, "wb")
+                try:
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        received += len(chunk)
+                        if received > self.maxBytes:
+                            raise ImageError("Too large: over {} bytes".format(self.maxBytes))
+                        if len(head) < MAGIC_BYTES:
+                            head += chunk[:MAGIC_BYTES]
+                            if len(head) >= MAGIC_BYTES and not isImage(head):
+                                raise ImageError("Not an image: bad signature")
+                        digest.update(chunk)
+                        await loop.run_in_executor(self.threads, f.write, chunk)
+                finally:
+                    await loop.run_in_executor(self.threads, f.close)
+                if not isImage(head):
+                    raise ImageError("Not an image: bad signature")
+                return response.status, response.headers, {
+                    "bytes": received,
+                    "raw": digest.hexdigest(),
+                }
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ImageError(str(e) or type(e).__name__, retry=True)
+
+    # GET with retries, counting attempts in report #
+    async def fetchWithRetries(self, url, headers, path, report):
+        async with self.semaphore:
+            while True:
+                report["attempts"] += 1
+                try:
+                    return await self.fetch(url, headers, path)
+                except ImageError as e:
+                    if not e.retry or report["attempts"] > self.retries:
+                        raise
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** (report["attempts"] - 1))
+
+    # Cached blob for url with this source's normalization, downloading and
+    # normalizing only when the cache has no valid copy
+    async def resolve(self, source, url, ext, report):
+        loop = asyncio.get_running_loop()
+        key = variantKey(source, ext)
+        meta = self.cache.load(url)
+        blob = self.cache.variant(meta, key)
+        if blob is not None and self.cache.isFresh(meta):
+            report["cache"] = "fresh"
+            return blob
+        headers = {}
+        if blob is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        # Partial downloads never reach the cache or the folders #
+        download = self.cache.downloadPath(url)
+        try:
+            status, responseHeaders, body = await self.fetchWithRetries(
+                url, headers, download, report
+            )
+            if status == 304:
+                report["cache"] = "not modified"
+            else:
+                report["bytes"] = body["bytes"]
+                raw = body["raw"]
+                if meta is None or meta.get("raw") != raw:
+                    meta = {"raw": raw, "variants": {}}
+                    blob = None
+                else:
+                    blob = self.cache.variant(meta, key)
+                meta["etag"] = responseHeaders.get("ETag")
+                meta["last_modified"] = responseHeaders.get("Last-Modified")
+                if blob is None:
+                    # Unique per url, the extension picks the output format #
+                    temp = "{}.{}".format(download, ext)
+                    await self.save(source, download, temp)
+                    blob = await loop.run_in_executor(
+                        self.threads, self.cache.store, temp, ext
+                    )
+                    meta["variants"][key] = blob
+                    report["cache"] = "stored"
+                else:
+                    report["cache"] = "same content"
+        finally:
+            for path in (download, "{}.{}".format(download, ext)):
+                if os.path.exists(path):
+                    os.remove(path)
+        meta["url"] = url
+        meta["fetched"] = time.time()
+        await loop.run_in_executor(self.threads, self.cache.save, url, meta)
+        return blob
+
+    # Download one image through the cache and link it into the folder #
+    async def download(self, source, folder, url, linkfoto):
+        name = source["name"]
+        filename = os.path.join(folder, linkfoto)
+        ext = os.path.splitext(linkfoto)[1].lstrip(".").lower()
+        report = {
+            "url": url,
+            "linkfoto": linkfoto,
+            "bytes": 0,
+            "written": 0,
+            "attempts": 0,
+            "cache": None,
+            "error": None,
+        }
+        started = time.monotonic()
+        # Sources sharing an image wait for the first download #
+        lock = self.locks.get(url)
+        if lock is None:
+            lock = self.locks[url] = asyncio.Lock()
+        try:
+            async with lock:
+                blob = await self.resolve(source, url, ext, report)
+            report["written"] = await asyncio.get_running_loop().run_in_executor(
+                self.threads, self.cache.link, blob, filename
+            )
+        except (ImageError, OSError) as e:
+            report["error"] = str(e)
+            report["seconds"] = round(time.monotonic() - started, 3)
+            logging.error(
+                "{} | Failed to download {} after {} attempts: {}".format(
+                    name, url, report["attempts"], e
+                )
+            )
+            return report
+        report["seconds"] = round(time.monotonic() - started, 3)
+        logging.info(
+            "{} | Downloaded {} from {} ({}, {} bytes, {} written in {}s)".format(
+                name,
+                linkfoto,
+                url,
+                report["cache"],
+                report["bytes"],
+                report["written"],
+                report["seconds"],
+            )
+        )
+        return report
+
+    # Download every (url, linkfoto) of a source, returns one report per image #
+    async def run(self, source, folder, images):
+        return await asyncio.gather(
+            *(self.download(source, folder, url, linkfoto) for url, linkfoto in images)
+        )
+
+    # Prune the image cache off the loop, ImageCache.prune runs a pass at
+    # most once per PRUNE_INTERVAL #
+    async def prune(self):
+        try:
+            removed = await asyncio.get_running_loop().run_in_executor(
+                self.threads, self.cache.prune
+            )
+        except OSError as e:
+            logging.error("Failed to prune image cache: {}".format(e))
+            return
+        if removed:
+            logging.info("Image cache pruned, {} files removed".format(removed))
@@ -0,0 +1,124 @@
+# Python 3.11.1
+# Cross process single-flight lock: one refresh per folder at a time
+#
+# The lock is a file created with O_EXCL, holding the owner pid and time.
+# A lock older than `stale` seconds is treated as abandoned (killed worker,
+# crashed feed.py) and taken over. Takeovers go through a second O_EXCL
+# file and only remove the very file judged stale, so two processes
+# breaking the same lock can't both end up holding it.
+
+import os
+import time
+
+LOCK_FILE = "feed.lock"
+# Longer than the orchestrator deadline, so only dead holders go stale #
+LOCK_STALE = 600
+# Guard taken while breaking an abandoned lock, and when the guard itself
+# is abandoned (breaker killed between its two syscalls) #
+BREAK_SUFFIX = ".break"
+BREAK_STALE = 30
+
+
+# Same file and not touched since, for two os.stat results #
+def sameFile(first, second):
+    return (first.st_dev, first.st_ino, first.st_mtime_ns) == (
+        second.st_dev,
+        second.st_ino,
+        second.st_mtime_ns,
+    )
+
+
+class FileLock:
+    def __init__(self, path, stale=LOCK_STALE):
+        self.path = path
+        self.stale = stale
+        self.token = None
+
+    # Lock age in seconds, None when nobody holds it #
+    def age(self):
+        try:
+            return time.time() - os.path.getmtime(self.path)
+        except FileNotFoundError:
+            return None
+
+    # Someone (maybe another process) holds a live lock #
+    def held(self):
+        age = self.age()
+        return age is not None and age < self.stale
+
+    def stat(self):
+        try:
+            return os.stat(self.path)
+        except FileNotFoundError:
+            return None
+
+    # Try to take the lock once, never blocks #
+    def acquire(self):
+        for attempt in range(2):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                judged = self.stat()
+                if judged is None:
+                    continue
+                if time.time() - judged.st_mtime < self.stale:
+                    return False
+                # Break the abandoned lock and retry once #
+                self.breakStale(judged)
+                continue
+            self.token = "{} {}".format(os.getpid(), time.time())
+            with os.fdopen(fd, "w") as f:
+                f.write(self.token)
+            return True
+        return False
+
+    # Remove the lock judged abandoned, only if it is still that file: a
+    # lock another process took over in the meantime is left alone #
+    def breakStale(self, judged):
+        guard = self.path + BREAK_SUFFIX
+        try:
+            fd = os.open(guard, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(guard) > BREAK_STALE:
+                    os.remove(guard)
+            except FileNotFoundError:
+                pass
+            return
+        os.close(fd)
+        try:
+            current = self.stat()
+            if current is not None and sameFile(current, judged):
+                os.remove(self.path)
+        finally:
+            os.remove(guard)
+
+    # Release only a lock we still own #
+    def release(self):
+        if self.token is None:
+            return
+        try:
+            with open(self.path, "r") as f:
+                owner = f.read()
+            if owner == self.token:
+                os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self.token = None
+
+
+# Remove the lock of a process killed without running its finally (the
+# orchestrator deadline), only while that pid still owns it #
+def releaseDead(path, pid):
+    try:
+        with open(path, "r") as f:
+            owner = f.read()
+    except FileNotFoundError:
+        return False
+    if owner.split(" ")[0] != str(pid):
+        return False
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    return True
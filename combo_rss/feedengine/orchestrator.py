@@ -0,0 +1,147 @@
+# Python 3.11.1
+# Concurrent refresh of many sources with a parallelism limit and deadlines
+#
+# Two modes:
+#   tasks      every source is an asyncio task in this process, sharing the
+#              engine session and blocked words; best for network bound runs
+#   processes  every source runs in its own worker process that is killed at
+#              the deadline; best for CPU bound runs (many PIL recompressions)
+#              or sources that can hang outside of the event loop
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+
+from . import registry
+from .engine import (
+    ROOT,
+    SKIPPED,
+    STATUS_ERROR,
+    STATUS_OK,
+    STATUS_SKIPPED,
+    STATUS_TIMEOUT,
+    FeedEngine,
+    runSources,
+    setupLogging,
+)
+from .lock import LOCK_FILE, releaseDead
+
+MODES = ("tasks", "processes")
+
+
+def result(status, started, error=None):
+    return {
+        "status": status,
+        "seconds": round(time.monotonic() - started, 3),
+        "error": error,
+    }
+
+
+## Tasks ##
+
+
+# Refresh one source on a shared engine, isolating errors and late sources #
+async def refreshWithDeadline(engine, source, deadline):
+    name = source["name"]
+    started = time.monotonic()
+    try:
+        if await asyncio.wait_for(engine.refresh(source), deadline) is SKIPPED:
+            return result(STATUS_SKIPPED, started, "already running")
+        return result(STATUS_OK, started)
+    except asyncio.TimeoutError:
+        logging.error("{} | TIMEOUT after {}s".format(name, deadline))
+        return result(STATUS_TIMEOUT, started, "timeout")
+    except Exception as e:
+        logging.error("{} | ERROR {}".format(name, e))
+        return result(STATUS_ERROR, started, str(e))
+
+
+async def runTasks(names=None, parallel=8, deadline=120, wait=False):
+    semaphore = asyncio.Semaphore(parallel)
+
+    async def runOne(engine, source):
+        async with semaphore:
+            return source["name"], await refreshWithDeadline(engine, source, deadline)
+
+    async with FeedEngine(wait=wait) as engine:
+        done = await asyncio.gather(
+            *(runOne(engine, source) for source in registry.getSources(names))
+        )
+    return dict(done)
+
+
+## Processes ##
+
+
+# Worker process entry point, logs to the folder's feed.log like feed.py #
+def sourceWorker(name, wait=False):
+    setupLogging(os.path.join(ROOT, name, "feed.log"))
+    results = runSources([name], wait)
+    raise SystemExit(results[name])
+
+
+def runProcesses(names=None, parallel=8, deadline=120, wait=False):
+    context = multiprocessing.get_context("spawn")
+    pending = [source["name"] for source in registry.getSources(names)]
+    order = list(pending)
+    running = {}
+    results = {}
+    while pending or running:
+        # Start workers up to the parallelism limit #
+        while pending and len(running) < parallel:
+            name = pending.pop(0)
+            process = context.Process(
+                target=sourceWorker, args=(name, wait), name=name
+            )
+            process.start()
+            running[name] = (process, time.monotonic())
+        # Collect finished workers and kill the late ones #
+        for name, (process, started) in list(running.items()):
+            if not process.is_alive():
+                process.join()
+                if process.exitcode == STATUS_OK:
+                    results[name] = result(STATUS_OK, started)
+                elif process.exitcode == STATUS_SKIPPED:
+                    results[name] = result(STATUS_SKIPPED, started, "already running")
+                else:
+                    error = "exit code {}".format(process.exitcode)
+                    logging.error("{} | ERROR {}".format(name, error))
+                    results[name] = result(STATUS_ERROR, started, error)
+                del running[name]
+            elif time.monotonic() - started > deadline:
+                process.terminate()
+                process.join()
+                logging.error("{} | TIMEOUT after {}s".format(name, deadline))
+                # Its lock would block the folder until it goes stale #
+                if releaseDead(os.path.join(ROOT, name, LOCK_FILE), process.pid):
+                    logging.info("{} | Removed the lock of the killed worker".format(name))
+                results[name] = result(STATUS_TIMEOUT, started, "timeout")
+                del running[name]
+        time.sleep(0.05)
+    return {name: results[name] for name in order}
+
+
+# Refresh folders concurrently, returns {folder: {status, seconds, error}} #
+# wait: folders already being refreshed by another process are waited for
+# instead of skipped
+def runConcurrent(names=None, parallel=8, deadline=120, mode="tasks", wait=False):
+    if mode not in MODES:
+        raise ValueError("Unknown mode {}, use one of {}".format(mode, MODES))
+    started = time.monotonic()
+    if mode == "tasks":
+        results = asyncio.run(runTasks(names, parallel, deadline, wait))
+    else:
+        results = runProcesses(names, parallel, deadline, wait)
+    for name, work in results.items():
+        logging.info(
+            "RETURNS {} {} in {}s".format(name, work["status"], work["seconds"])
+        )
+    skipped = sum(1 for work in results.values() if work["status"] == STATUS_SKIPPED)
+    logging.info(
+        "Refreshed {} sources in {}s, {} skipped (already running)".format(
+            len(results) - skipped, round(time.monotonic() - started, 3), skipped
+        )
+    )
+    return results
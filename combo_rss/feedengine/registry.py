@@ -0,0 +1,266 @@
+# Python 3.11.1
+# Source registry: one entry per player folder
+
+from .rules import extractorNames
+
+## Defaults ##
+# Every entry below is merged over DEFAULTS, so only the differences
+# from the common feed.py behaviour are written out per source.
+#
+# urls            list of (url, publisher) pairs, merged in order
+# title           "publisher" | "category" | "title" | "unescaped"
+# description     "title" | "description" | "paragraph" | "paragraphLine"
+#                 | "text" (html to plain text) | "strip" (text cut at 300)
+# image           image extractor name or list of names tried in order
+#                 (see rules.EXTRACTORS, rules.PAGE_EXTRACTORS), or None
+# extensions      accepted image extensions, None accepts anything
+# placeholder     linkfoto used when the item has no image (else skipped)
+# max_items       items written to feed.xml, None for no limit
+# max_age         seconds since pubDate, None to skip the check
+# min_description minimum len(item["description"]), None to skip
+# block_fields    item fields checked against the blocked words
+# fields          optional item fields copied to feed.xml
+# dedupe          skip items whose link, guid or folded title is already in
+#                 the output (see dedupe.py)
+# near_duplicates None | "tag" | "suppress" | "best", what to do with a story
+#                 another source already has (see cluster.py)
+# quality         lowest JPEG quality used to fit an image in image_bytes
+# image_size      (width, height) the player shows images at (background
+#                 "cover"), bigger images are downscaled to just cover it;
+#                 also picks the rendition downloaded (rules.bestRendition)
+# image_bytes     byte budget per image, None to keep the downloaded size
+# verify          verify the feed host TLS certificate
+# recover         parse broken XML with lxml's recovering parser
+# output          output file name inside the folder
+# layout          "player" (time + item/linkfoto) or "channel"
+# compact         write the output without indentation whitespace
+# interval        seconds between refreshes when run by feedengine.daemon
+DEFAULTS = {
+    "urls": [],
+    "title": "publisher",
+    "description": "title",
+    "image": None,
+    "strip_query": False,
+    "extensions": ("jpg",),
+    "placeholder": None,
+    "max_items": 11,
+    "max_age": None,
+    "min_description": None,
+    "block_fields": ("title", "description"),
+    "fields": (),
+    "dedupe": False,
+    "near_duplicates": None,
+    "quality": 20,
+    "image_size": (1920, 1080),
+    "image_bytes": 400000,
+    "verify": False,
+    "recover": False,
+    "output": "feed.xml",
+    "layout": "player",
+    "compact": False,
+    "interval": 3600,
+}
+
+# Shared settings for the g1 / globo feeds #
+GLOBO = {
+    "image": "media:content",
+    "max_age": 259200,
+    "min_description": 50,
+    "block_fields": ("title",),
+    "fields": ("pubDate",),
+}
+
+# Shared settings for the uol midiaindoor feeds #
+UOL = {
+    "title": "title",
+    "description": "description",
+    "image": "linkfoto",
+}
+
+# Shared settings for the gazeta do povo feeds #
+GAZETA = {
+    "image": "image",
+    "extensions": None,
+}
+
+# Shared settings for the investing feeds #
+INVESTING = {
+    "image": "enclosure",
+    "extensions": None,
+    "placeholder": "./assets/placeholder.png",
+}
+
+# Shared settings for the multi publisher "ecoagro" feeds #
+ECOAGRO = {
+    "max_items": None,
+    "max_age": 60 * 60 * 24 * 7,
+    "min_description": 50,
+    "block_fields": ("title",),
+    "fields": ("pubDate",),
+    "dedupe": True,
+    "quality": 50,
+}
+
+## Sources ##
+SOURCES = {
+    "conectaVerde/default": {
+        "urls": [("https://conectaverde.com.br/rss", None)],
+        "title": "title",
+        "description": "paragraphLine",
+        "fields": ("category",),
+        "verify": True,
+    },
+    "cruzeiroDoSul/default": {
+        "urls": [("http://cruzeirofm.com.br/feed", None)],
+        "title": "title",
+        "description": "strip",
+        "max_items": None,
+        "block_fields": (),
+        "fields": ("link", "pubDate"),
+        "output": "new_feed.xml",
+        "layout": "channel",
+    },
+    "engarrafador/default": {
+        "urls": [("https://engarrafadormoderno.com.br/feed", None)],
+        "title": "unescaped",
+        "description": "text",
+        "min_description": 50,
+        "verify": True,
+    },
+    "exame/default": {
+        "urls": [("https://exame.com/feed/", None)],
+        "title": "category",
+        "image": "enclosure",
+    },
+    "exame/invest": {
+        "urls": [("https://exame.com/invest/feed/", None)],
+        "title": "category",
+        "image": "enclosure",
+    },
+    "g1/agronegocios": dict(
+        GLOBO, urls=[("https://pox.globo.com/rss/g1/economia/agronegocios/", "Economia")]
+    ),
+    "g1/default": dict(GLOBO, urls=[("https://pox.globo.com/rss/g1/", "Economia")]),
+    "g1/ecoagro": dict(
+        GLOBO,
+        **ECOAGRO,
+        urls=[
+            ("https://pox.globo.com/rss/g1/economia/agronegocios/", "Agronegócios"),
+            ("https://pox.globo.com/rss/g1/economia/", "Economia"),
+        ]
+    ),
+    "g1/economia": dict(
+        GLOBO, urls=[("https://pox.globo.com/rss/g1/economia/", "Economia")]
+    ),
+    "g1/globorural": dict(
+        GLOBO, urls=[("https://pox.globo.com/rss/globorural/", "Economia")]
+    ),
+    "g1/valoreconomico": dict(
+        GLOBO, urls=[("https://pox.globo.com/rss/valor/", "Economia")]
+    ),
+    "gazeta/agronegocio": dict(
+        GAZETA,
+        urls=[("https://www.gazetadopovo.com.br/feed/rss/agronegocio.xml", "Agronegócio")],
+    ),
+    "gazeta/default": dict(
+        GAZETA, urls=[("https://www.gazetadopovo.com.br/feed/rss/mundo.xml", "Mundo")]
+    ),
+    "gazeta/ecoagro": dict(
+        ECOAGRO,
+        image="image",
+        urls=[
+            ("https://www.gazetadopovo.com.br/feed/rss/agronegocio.xml", "Agronegócios"),
+            ("https://www.gazetadopovo.com.br/feed/rss/economia.xml", "Economia"),
+        ],
+    ),
+    "gazeta/economia": dict(
+        GAZETA,
+        urls=[("https://www.gazetadopovo.com.br/feed/rss/economia.xml", "Economia")],
+    ),
+    "infomoney/default": {
+        "urls": [("https://www.infomoney.com.br/feed/", None)],
+        "title": "category",
+        "image": "description:img",
+        "strip_query": True,
+        "extensions": None,
+        "block_fields": ("title",),
+    },
+    "investing/default": dict(
+        INVESTING, urls=[("https://br.investing.com/rss/news_287.rss", "Geral")]
+    ),
+    "investing/economia": dict(
+        INVESTING, urls=[("https://br.investing.com/rss/news_14.rss", "Geral")]
+    ),
+    "investnews/default": {
+        "urls": [("https://investnews.com.br/feed/", None)],
+        "title": "title",
+        "description": "text",
+        "verify": True,
+    },
+    "moneytimes/default": {
+        "urls": [("https://www.moneytimes.com.br/feed/", None)],
+        "title": "category",
+        "image": "image",
+    },
+    "moneytimes/economia": {
+        "urls": [("https://www.moneytimes.com.br/economia/feed", None)],
+        "title": "category",
+        "image": "image",
+        "recover": True,
+    },
+    "rural/default": {
+        "urls": [("https://www.canalrural.com.br/feed/", None)],
+        "title": "title",
+        "description": "paragraph",
+        "image": "description:img",
+    },
+    "tecmundo/default": {
+        "urls": [("https://rss.tecmundo.com.br/feed/", None)],
+        "title": "category",
+        "image": "enclosure",
+    },
+    "tissueOnline/default": {
+        "urls": [("https://tissueonline.com.br/feed/", None)],
+        "title": "unescaped",
+        "description": "text",
+        "verify": True,
+    },
+    "umSoPlaneta/default": dict(
+        GLOBO,
+        urls=[("https://pox.globo.com/rss/umsoplaneta/", "Economia")],
+        max_age=None,
+        min_description=None,
+        fields=(),
+    ),
+    "uol/cotidiano": dict(
+        UOL, urls=[("http://www3.uol.com.br/xml/midiaindoor/cotidiano.xml", None)]
+    ),
+    "uol/economia": dict(
+        UOL, urls=[("http://www3.uol.com.br/xml/midiaindoor/economia.xml", None)]
+    ),
+    "uol/entretenimento": dict(
+        UOL, urls=[("http://www3.uol.com.br/xml/midiaindoor/entretenimento.xml", None)]
+    ),
+    "uol/esportes": dict(
+        UOL, urls=[("http://www3.uol.com.br/xml/midiaindoor/esporte.xml", None)]
+    ),
+}
+
+
+# Get merged settings for one folder #
+def getSource(name):
+    if name not in SOURCES:
+        raise KeyError("Unknown source {}".format(name))
+    source = dict(DEFAULTS)
+    source.update(SOURCES[name])
+    source["name"] = name
+    # Unknown extractors fail here, not on the first item #
+    source["image"] = extractorNames(source["image"]) or None
+    return source
+
+
+# Get merged settings for a list of folders, all of them when empty #
+def getSources(names=None):
+    if not names:
+        names = list(SOURCES)
+    return [getSource(name) for name in names]
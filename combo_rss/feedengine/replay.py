@@ -0,0 +1,394 @@
+# Python 3.11.1
+# Local stand-in for every feed, image and blocked words url, with latency
+# and fault injection, for load tests without globo / uol / investing
+# Usage: Python311\python.exe -m feedengine.replay [--port 8700] [--latency MS]
+#        [--jitter MS] [--bandwidth KBPS] [--faults FILE] [folder ...]
+#        Python311\python.exe -m feedengine.replay --storm [--clones N]
+#        [--parallel N] [--deadline S] [--faults FILE] [folder ...]
+#
+# Serves the bench fixtures (fixtures.py, recorded first, generated for the
+# rest) as http://127.0.0.1:8700/<scheme>/<host>/<path>?<query>. With
+# FEEDENGINE_REPLAY=http://127.0.0.1:8700 (or --replay) FetchClient sends
+# every request there instead of the real host (see client.py).
+#
+# Faults file: JSON list of rules, the first rule whose "match" regex finds
+# the original url applies, over the command line defaults:
+#   latency / jitter   ms before the response starts
+#   bandwidth          KB/s the body is sent at
+#   etag               send ETag / Last-Modified (default true)
+#   not_modified       answer 304 to matching validators (default true)
+#   status, burst,     answer status to `burst` requests in a row out of
+#   every              every `every` (all of them without every)
+#   truncate           fraction of the body sent before the connection drops
+#   hang               "headers": never answer, "body": stop halfway
+# e.g. [{"match": "glbimg", "latency": 800, "bandwidth": 256},
+#       {"match": "investing", "status": 503, "burst": 3, "every": 10}]
+#
+# --storm runs clones of the sources (own urls and images per clone) against
+# a replay server in another process, like the daemon refreshing hundreds
+# of folders at once, and prints how the refreshes went.
+
+import argparse
+import asyncio
+import collections
+import email.utils
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+from . import fixtures, registry
+from .bench import benchSource, summarize
+from .blocked import BlockedWordsProvider
+from .client import FetchClient
+from .engine import FeedEngine
+from .orchestrator import (
+    STATUS_ERROR,
+    STATUS_OK,
+    STATUS_SKIPPED,
+    STATUS_TIMEOUT,
+    refreshWithDeadline,
+)
+
+REPLAY_PORT = 8700
+# First path segment telling the clones of a source apart, ignored for
+# lookups: https://host/bench-clone-3/rss/feed #
+CLONE_PREFIX = "bench-clone-"
+CLONE_PATH = re.compile(r"^([^/]*)/{}(\d+)(/.*)?$".format(CLONE_PREFIX))
+# Seconds between two writes when throttling #
+THROTTLE_STEP = 0.05
+DEFAULT_FAULT = {
+    "latency": 0,
+    "jitter": 0,
+    "bandwidth": None,
+    "etag": True,
+    "not_modified": True,
+    "status": None,
+    "burst": 1,
+    "every": None,
+    "truncate": None,
+    "hang": None,
+}
+URLS = re.compile(rb"https?://[^\s\"'<>]+")
+
+
+def loadFaults(path):
+    if not path:
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        rules = json.load(f)
+    for rule in rules:
+        rule["pattern"] = re.compile(rule.get("match", ""))
+    return rules
+
+
+class ReplayServer:
+    def __init__(self, fixtureSet, faults=(), defaults=None, seed=0):
+        self.fixtures = fixtureSet
+        self.faults = list(faults)
+        self.defaults = dict(DEFAULT_FAULT, **(defaults or {}))
+        self.random = random.Random(seed)
+        self.counters = collections.Counter()
+        self.stats = collections.Counter()
+        self.bodies = {}
+        self.images = {
+            url.encode("utf-8")
+            for url, entry in fixtureSet.items()
+            if entry["type"].startswith("image/")
+        }
+
+    # Settings for url: first matching rule over the defaults, with its index #
+    def fault(self, url):
+        for index, rule in enumerate(self.faults):
+            if rule["pattern"].search(url):
+                return index, dict(self.defaults, **rule)
+        return None, self.defaults
+
+    # Original url and clone number of a replay request #
+    def originalUrl(self, request):
+        tail = request.match_info["tail"]
+        clone = None
+        match = CLONE_PATH.match(tail)
+        if match is not None:
+            clone = match.group(2)
+            tail = match.group(1) + (match.group(3) or "/")
+        url = "{}://{}".format(request.match_info["scheme"], tail)
+        if request.query_string:
+            url += "?" + request.query_string
+        return url, clone
+
+    # Feed bodies of a clone point at the clone's own image urls #
+    def cloneFeed(self, body, clone):
+        def replace(match):
+            url = match.group(0)
+            if url.replace(b"&amp;", b"&") not in self.images:
+                return url
+            return cloneUrl(url.decode("utf-8"), clone).encode("utf-8")
+
+        return URLS.sub(replace, body)
+
+    def body(self, url, clone, requested):
+        key = (url, clone)
+        if key not in self.bodies:
+            entry = self.fixtures[url]
+            with open(entry["path"], "rb") as f:
+                data = f.read()
+            if entry["salt"] or (clone is not None and entry["type"].startswith("image/")):
+                data = fixtures.saltImage(data, requested)
+            elif clone is not None:
+                data = self.cloneFeed(data, clone)
+            self.bodies[key] = (data, '"{}"'.format(hashlib.sha1(data).hexdigest()))
+        return self.bodies[key]
+
+    # Should this request get the rule's status: `burst` in every `every` #
+    def failing(self, index, settings):
+        if settings["status"] is None:
+            return False
+        count = self.counters[index]
+        self.counters[index] += 1
+        if not settings["every"]:
+            return True
+        return count % settings["every"] < settings["burst"]
+
+    async def handle(self, request):
+        url, clone = self.originalUrl(request)
+        self.stats["requests"] += 1
+        index, settings = self.fault(url)
+        delay = settings["latency"] + self.random.uniform(0, settings["jitter"])
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if settings["hang"] == "headers":
+            self.stats["hung"] += 1
+            await asyncio.sleep(3600)
+        if self.failing(index, settings):
+            self.stats[settings["status"]] += 1
+            return web.Response(status=settings["status"], text="Injected failure")
+        if url not in self.fixtures:
+            self.stats[404] += 1
+            return web.Response(status=404, text="No fixture for {}".format(url))
+        entry = self.fixtures[url]
+        body, etag = self.body(url, clone, str(request.rel_url))
+        headers = {"Content-Type": entry["type"]}
+        if settings["etag"]:
+            modified = email.utils.formatdate(entry["created"] or 0, usegmt=True)
+            headers["ETag"] = etag
+            headers["Last-Modified"] = modified
+            if settings["not_modified"] and (
+                request.headers.get("If-None-Match") == etag
+                or request.headers.get("If-Modified-Since") == modified
+            ):
+                self.stats[304] += 1
+                return web.Response(status=304, headers=headers)
+        return await self.stream(request, body, headers, settings)
+
+    # Send body with throttling, truncation or a stall halfway #
+    async def stream(self, request, body, headers, settings):
+        response = web.StreamResponse(status=200, headers=headers)
+        response.content_length = len(body)
+        sent = len(body)
+        if settings["truncate"] is not None:
+            sent = int(len(body) * settings["truncate"])
+        if settings["hang"] == "body":
+            sent = len(body) // 2
+        await response.prepare(request)
+        step = len(body) or 1
+        if settings["bandwidth"]:
+            step = max(1, int(settings["bandwidth"] * 1024 * THROTTLE_STEP))
+        for start in range(0, sent, step):
+            await response.write(body[start : min(start + step, sent)])
+            if settings["bandwidth"]:
+                await asyncio.sleep(THROTTLE_STEP)
+        self.stats["bytes"] += sent
+        if settings["hang"] == "body":
+            self.stats["stalled"] += 1
+            await asyncio.sleep(3600)
+        if sent < len(body):
+            # Drop the connection with the body short of Content-Length #
+            self.stats["truncated"] += 1
+            request.transport.close()
+            return response
+        self.stats[200] += 1
+        await response.write_eof()
+        return response
+
+    async def handleStats(self, request):
+        return web.json_response({str(key): value for key, value in self.stats.items()})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/_stats", self.handleStats)
+        app.router.add_get("/{scheme:https?}/{tail:.*}", self.handle)
+        return app
+
+
+async def serve(port, faults=(), defaults=None, sources=None):
+    fixtures.generateFixtures(sources or registry.getSources())
+    server = ReplayServer(fixtures.loadFixtures(), faults, defaults)
+    runner = web.AppRunner(server.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    logging.info("Replay server on http://127.0.0.1:{}".format(port))
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await runner.cleanup()
+
+
+# Server process entry point for storm #
+def serveProcess(port, faultsFile, defaults):
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    asyncio.run(serve(port, loadFaults(faultsFile), defaults))
+
+
+## Storm ##
+
+
+# url with the clone segment after the host #
+def cloneUrl(url, clone):
+    scheme, _, rest = url.partition("://")
+    host, slash, path = rest.partition("/")
+    return "{}://{}/{}{}{}{}".format(scheme, host, CLONE_PREFIX, clone, slash, path)
+
+
+# Clones of sources with their own folder names and urls #
+def cloneSources(sources, clones):
+    cloned = []
+    for clone in range(clones):
+        for source in sources:
+            urls = [(cloneUrl(url, clone), publisher) for url, publisher in source["urls"]]
+            cloned.append(dict(source, name="{}~{}".format(source["name"], clone), urls=urls))
+    return cloned
+
+
+async def waitServer(base, timeout=60):
+    started = time.monotonic()
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(base + "/_stats") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() - started > timeout:
+                raise RuntimeError("Replay server did not start")
+            await asyncio.sleep(0.2)
+
+
+async def serverStats(base):
+    async with aiohttp.ClientSession() as session:
+        async with session.get(base + "/_stats") as response:
+            return await response.json()
+
+
+# Refresh every clone at once against the replay server at base #
+async def storm(base, sources, parallel, deadline):
+    await waitServer(base)
+    root = tempfile.mkdtemp(prefix="storm")
+    semaphore = asyncio.Semaphore(parallel)
+    provider = BlockedWordsProvider(cacheFile=os.path.join(root, "blocked_words.json"))
+
+    async def runOne(engine, source):
+        os.makedirs(os.path.join(root, source["name"]), exist_ok=True)
+        async with semaphore:
+            return source["name"], await refreshWithDeadline(engine, source, deadline)
+
+    started = time.monotonic()
+    try:
+        client = FetchClient(replay=base)
+        async with FeedEngine(root, client=client, blockedWords=provider) as engine:
+            done = dict(await asyncio.gather(*(runOne(engine, source) for source in sources)))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return done, time.monotonic() - started, await serverStats(base)
+
+
+def runStorm(args):
+    sources = registry.getSources(args.folders)
+    fixtures.generateFixtures(sources)
+    fixtureSet = fixtures.loadFixtures()
+    now = time.time()
+    sources = cloneSources(
+        [benchSource(source, fixtureSet, now) for source in sources], args.clones
+    )
+    defaults = {"latency": args.latency, "jitter": args.jitter, "bandwidth": args.bandwidth}
+    process = multiprocessing.get_context("spawn").Process(
+        target=serveProcess, args=(args.port, args.faults, defaults), daemon=True
+    )
+    process.start()
+    try:
+        base = "http://127.0.0.1:{}".format(args.port)
+        done, seconds, stats = asyncio.run(storm(base, sources, args.parallel, args.deadline))
+    finally:
+        process.terminate()
+        process.join()
+    statuses = collections.Counter(work["status"] for work in done.values())
+    summary = summarize([work["seconds"] for work in done.values()])
+    print(
+        "{} refreshes in {}s: {} ok, {} errors, {} timeouts, {} skipped".format(
+            len(done),
+            round(seconds, 3),
+            statuses[STATUS_OK],
+            statuses[STATUS_ERROR],
+            statuses[STATUS_TIMEOUT],
+            statuses[STATUS_SKIPPED],
+        )
+    )
+    print(
+        "per refresh ms: p50 {} p90 {} p99 {} max {}".format(
+            summary["p50"], summary["p90"], summary["p99"], summary["max"]
+        )
+    )
+    print("server: {}".format(json.dumps(stats, sort_keys=True)))
+    for name, work in sorted(done.items()):
+        if work["status"]:
+            print("{} RETURNS {} in {}s {}".format(name, work["status"], work["seconds"], work["error"] or ""))
+    return 1 if statuses[STATUS_ERROR] or statuses[STATUS_TIMEOUT] else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="feedengine.replay", description="Replay server for feeds and images"
+    )
+    parser.add_argument(
+        "folders", nargs="*", help="source folders like g1/default, all when empty"
+    )
+    parser.add_argument("--port", type=int, default=REPLAY_PORT)
+    parser.add_argument("--latency", type=float, default=0, help="ms before every response")
+    parser.add_argument("--jitter", type=float, default=0, help="random extra ms, up to")
+    parser.add_argument("--bandwidth", type=float, help="KB/s per response")
+    parser.add_argument("--faults", help="JSON file with fault rules")
+    parser.add_argument(
+        "--storm", action="store_true", help="refresh clones of the sources against a server"
+    )
+    parser.add_argument("--clones", type=int, default=10, help="storm: copies of every source")
+    parser.add_argument("--parallel", type=int, default=32, help="storm: refreshes at once")
+    parser.add_argument("--deadline", type=float, default=120, help="storm: seconds per refresh")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    if args.storm:
+        return runStorm(args)
+    defaults = {"latency": args.latency, "jitter": args.jitter, "bandwidth": args.bandwidth}
+    print("Replay server on http://127.0.0.1:{}".format(args.port))
+    try:
+        asyncio.run(
+            serve(args.port, loadFaults(args.faults), defaults, registry.getSources(args.folders))
+        )
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
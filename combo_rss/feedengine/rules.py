@@ -0,0 +1,348 @@
+# Python 3.11.1
+# Per source rules for title, description and image extraction
+
+import re
+from html import unescape
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+## Helpers ##
+
+
+# Get text from a xmltodict value (str, list of str or {"#text": ...}) #
+def firstText(value):
+    if isinstance(value, list):
+        value = value[0] if value else ""
+    if isinstance(value, dict):
+        value = value.get("#text", "")
+    if value is None:
+        return ""
+    return str(value)
+
+
+# Get the first <p>...</p> of a html description #
+def firstParagraph(text):
+    if "<p>" not in text:
+        return text
+    return text.split("<p>")[1].split("</p>")[0]
+
+
+# Html tokens: tag (closing slash, name, attributes), comment / doctype,
+# text up to the next tag, or a stray "<" #
+HTML_TOKENS = re.compile(
+    r"<(/?)([a-zA-Z][\w:-]*)([^>]*)>|<!--.*?(?:-->|$)|<[!?][^>]*>|([^<]+)|<", re.DOTALL
+)
+# Tags that separate words, the others join text ("a<b>b</b>" is "ab") #
+BLOCK_TAGS = frozenset(
+    "address article aside blockquote br dd div dl dt figcaption figure footer h1 h2 "
+    "h3 h4 h5 h6 header hr li main nav ol p pre section table td th tr ul".split()
+)
+# Tags whose content is not text #
+SKIP_TAGS = frozenset(("script", "style", "noscript", "template"))
+TRUNCATED = " [...]"
+
+
+# Text of a html fragment in one pass: tags removed, entities decoded and
+# whitespace (&nbsp; too) collapsed. Text longer than budget characters is
+# cut there with " [...]", without reading the rest. Also returns the
+# first <img> tag, None when the fragment has none.
+def htmlToText(html, budget=None):
+    pieces = []
+    length = 0
+    space = False
+    skipping = None
+    image = None
+    for match in HTML_TOKENS.finditer(html):
+        closing, tag, _, text = match.groups()
+        if tag is not None:
+            tag = tag.lower()
+            if skipping is not None:
+                if closing and tag == skipping:
+                    skipping = None
+            elif tag in SKIP_TAGS and not closing:
+                skipping = tag
+            elif tag in BLOCK_TAGS:
+                space = True
+            elif tag == "img" and image is None:
+                image = match.group(0)
+            continue
+        if text is None and match.group(0) == "<":
+            text = "<"
+        if text is None or skipping is not None:
+            continue
+        for chunk in textChunks(text, None if budget is None else budget - length):
+            words = chunk.split()
+            if not words:
+                space = True
+                continue
+            if pieces and (space or chunk[0].isspace()):
+                pieces.append(" ")
+                length += 1
+            joined = " ".join(words)
+            pieces.append(joined)
+            length += len(joined)
+            space = chunk[-1].isspace()
+            if budget is not None and length > budget:
+                if image is None:
+                    rest = IMG_TAG.search(html, match.end())
+                    image = rest.group(0) if rest else None
+                return "".join(pieces)[:budget].rstrip() + TRUNCATED, image
+    return "".join(pieces), image
+
+
+# Decoded slices of a text token, small enough not to decode much past
+# what is left of the budget. Slices never cut an entity in two.
+def textChunks(text, left=None):
+    if left is None or len(text) <= 4 * left + 64:
+        yield unescape(text) if "&" in text else text
+        return
+    size = 4 * left + 64
+    start = 0
+    while start < len(text):
+        end = start + size
+        entity = text.rfind("&", max(start, end - 32), end)
+        if entity > start and ";" not in text[entity:end]:
+            end = entity
+        chunk = text[start:end]
+        yield unescape(chunk) if "&" in chunk else chunk
+        start = end
+
+
+## Titles ##
+
+
+TITLES = {
+    "publisher": lambda item, publisher: publisher or "",
+    "category": lambda item, publisher: firstText(item.get("category")),
+    "title": lambda item, publisher: firstText(item.get("title")),
+    "unescaped": lambda item, publisher: unescape(firstText(item.get("title"))),
+}
+
+## Descriptions ##
+
+
+DESCRIPTIONS = {
+    "title": lambda item: firstText(item.get("title")),
+    "description": lambda item: firstText(item.get("description")),
+    "paragraph": lambda item: firstParagraph(firstText(item.get("description"))),
+    "paragraphLine": lambda item: firstParagraph(
+        firstText(item.get("description"))
+    ).split("<br />")[0],
+    "strip": lambda item: htmlToText(firstText(item.get("description")), 300)[0],
+    "text": lambda item: htmlToText(firstText(item.get("description")))[0],
+}
+
+## Image extractors ##
+# Each extractor returns the renditions of the item image as a list of
+# (url, width, height), width / height None when not declared, empty when
+# the item has none. bestRendition picks one of them.
+# A source lists one name or several tried in order ("image" setting).
+
+
+# First <img> tag of a html fragment and its attributes #
+IMG_TAG = re.compile(r"<img\b[^>]*>", re.IGNORECASE)
+ATTRIBUTE = re.compile(r"""([\w:-]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""")
+# WordPress names resized copies photo-1024x576.jpg #
+SIZE_SUFFIX = re.compile(r"-(\d+)x(\d+)\.\w+(?:[?#]|$)")
+# <meta property="og:image" content="..."> with the attributes in any order #
+OG_IMAGE = re.compile(
+    r"""<meta\b(?=[^>]*\bproperty\s*=\s*["']og:image(?::url)?["'])"""
+    r"""[^>]*\bcontent\s*=\s*["']([^"']+)["']""",
+    re.IGNORECASE,
+)
+
+
+def toInt(value):
+    try:
+        return int(str(value).strip().rstrip("pxw"))
+    except (TypeError, ValueError):
+        return None
+
+
+def rendition(url, width=None, height=None):
+    url = unescape(url.strip())
+    if width is None:
+        match = SIZE_SUFFIX.search(url)
+        if match is not None:
+            width, height = int(match.group(1)), int(match.group(2))
+    return (url, width, height)
+
+
+# Every dict of a value that may be a list #
+def allDicts(value):
+    values = value if isinstance(value, list) else [value]
+    return [value for value in values if isinstance(value, dict)]
+
+
+def firstDict(value):
+    values = allDicts(value)
+    return values[0] if values else None
+
+
+def mediaContent(item):
+    medias = allDicts(item.get("media:content"))
+    for group in allDicts(item.get("media:group")):
+        medias += allDicts(group.get("media:content"))
+    return [
+        rendition(media["@url"], toInt(media.get("@width")), toInt(media.get("@height")))
+        for media in medias
+        if media.get("@url") and media.get("@medium", "image") == "image"
+    ]
+
+
+def enclosure(item):
+    enclosure = firstDict(item.get("enclosure"))
+    url = enclosure and (enclosure.get("@url") or enclosure.get("url"))
+    return [rendition(url)] if url else []
+
+
+def itunesImage(item):
+    image = firstDict(item.get("itunes:image"))
+    return [rendition(image["@href"])] if image and image.get("@href") else []
+
+
+def image(item):
+    image = firstDict(item.get("image"))
+    return [rendition(image["url"])] if image and image.get("url") else []
+
+
+def linkfoto(item):
+    url = firstText(item.get("linkfoto"))
+    return [rendition(url)] if url else []
+
+
+# src and srcset renditions of the first <img> of a html fragment #
+def htmlImg(text):
+    tag = htmlToText(text, 0)[1]
+    if tag is None:
+        return []
+    attributes = {
+        name.lower(): first or second or third
+        for name, first, second, third in ATTRIBUTE.findall(tag)
+    }
+    renditions = []
+    if attributes.get("src"):
+        renditions.append(
+            rendition(
+                attributes["src"],
+                toInt(attributes.get("width")),
+                toInt(attributes.get("height")),
+            )
+        )
+    # "url 300w, url 1024w", density descriptors ("2x") declare no width #
+    for candidate in unescape(attributes.get("srcset", "")).split(","):
+        parts = candidate.split()
+        if not parts:
+            continue
+        width = toInt(parts[1]) if len(parts) > 1 and parts[1].endswith("w") else None
+        renditions.append(rendition(parts[0], width))
+    return renditions
+
+
+def descriptionImg(item):
+    return htmlImg(firstText(item.get("description")))
+
+
+def contentImg(item):
+    return htmlImg(firstText(item.get("content:encoded")))
+
+
+# og:image of an article page (html text) #
+def pageImage(page):
+    match = OG_IMAGE.search(page)
+    return [rendition(match.group(1))] if match else []
+
+
+EXTRACTORS = {
+    "media:content": mediaContent,
+    "enclosure": enclosure,
+    "itunes:image": itunesImage,
+    "image": image,
+    "linkfoto": linkfoto,
+    "description:img": descriptionImg,
+    "content:img": contentImg,
+}
+# Extractors reading the page at the item link instead of the item #
+PAGE_EXTRACTORS = {
+    "og:image": pageImage,
+}
+# Item fields an extractor needs that feeds are parsed without #
+EXTRACTOR_FIELDS = {
+    "content:img": ("content:encoded",),
+}
+
+
+# Extractor names of an "image" setting, KeyError for unknown names #
+def extractorNames(value):
+    if value is None:
+        return ()
+    names = (value,) if isinstance(value, str) else tuple(value)
+    for name in names:
+        if name not in EXTRACTORS and name not in PAGE_EXTRACTORS:
+            raise KeyError("Unknown image extractor {}".format(name))
+    return names
+
+
+# Fields a list of extractors needs parsed #
+def extractorFields(names):
+    return frozenset(field for name in names or () for field in EXTRACTOR_FIELDS.get(name, ()))
+
+
+# Smallest rendition covering size (width, height), else the largest declared
+# one, else the first. Returns its url, None when there is none.
+def bestRendition(renditions, size=None):
+    if not renditions:
+        return None
+    sized = [rendition for rendition in renditions if rendition[1] is not None]
+    if not sized:
+        return renditions[0][0]
+    if size is not None:
+        width, height = size
+        covering = [
+            rendition
+            for rendition in sized
+            if rendition[1] >= width and (rendition[2] is None or rendition[2] >= height)
+        ]
+        if covering:
+            return min(covering, key=lambda rendition: rendition[1])[0]
+    return max(sized, key=lambda rendition: rendition[1])[0]
+
+
+## Resized image urls ##
+# Hosts that resize on request: host (or parent domain) -> query parameters
+# set on the image url ({width} / {height} is the player image size) or
+# removed (None). Jetpack serves WordPress images through Photon, which
+# scales to w= keeping the aspect ratio (resize= and fit= would crop).
+RESIZE_TEMPLATES = {
+    "wp.com": {"w": "{width}", "resize": None, "fit": None},
+}
+
+
+def resizeTemplate(host):
+    while host:
+        if host in RESIZE_TEMPLATES:
+            return RESIZE_TEMPLATES[host]
+        host = host.partition(".")[2]
+    return None
+
+
+# Ask the image host for a copy at size when it has a template #
+def resizeUrl(url, size):
+    if size is None:
+        return url
+    parts = urlsplit(url)
+    template = resizeTemplate((parts.hostname or "").lower())
+    if template is None:
+        return url
+    query = dict(parse_qsl(parts.query, keep_blank_values=True))
+    for key, value in template.items():
+        if value is None:
+            query.pop(key, None)
+        else:
+            query[key] = value.format(width=size[0], height=size[1])
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+# Get extension from image url, without query string #
+def getExtension(url):
+    return url.split("?")[0].split(".")[-1]
@@ -0,0 +1,142 @@
+# Python 3.11.1
+# Per source item store: what was decided about every item already seen
+#
+# cache/items.sqlite3 keeps one row per (source, item key) with the digest
+# of the item as parsed, the rules it was checked with (source settings and
+# blocked words), the verdict, the built record, the image url (the image
+# cache key), the parsed pubDate, the story hash and first / last seen
+# times. A refresh only checks and builds items that are new or changed
+# since the last one; age, duplicates and positions are decided again on
+# every run. Rows not seen for `retention` seconds are deleted.
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from .dedupe import itemKeys
+
+# Longer than the longest max_age (7 days) #
+STORE_RETENTION = 60 * 60 * 24 * 8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    source TEXT NOT NULL,
+    key TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    rules TEXT NOT NULL,
+    accepted INTEGER NOT NULL,
+    built TEXT,
+    pubdate REAL,
+    story TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (source, key)
+);
+CREATE INDEX IF NOT EXISTS items_last_seen ON items (source, last_seen);
+"""
+
+UPSERT = """
+INSERT INTO items
+    (source, key, digest, rules, accepted, built, pubdate, story, first_seen, last_seen)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (source, key) DO UPDATE SET
+    digest = excluded.digest,
+    rules = excluded.rules,
+    accepted = excluded.accepted,
+    built = excluded.built,
+    pubdate = excluded.pubdate,
+    story = excluded.story,
+    last_seen = excluded.last_seen
+"""
+
+
+# Digest of an item as parsed, with the publisher it was merged from #
+def itemDigest(item, publisher):
+    data = json.dumps([item, publisher], sort_keys=True, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+# Stable key of an item: link or guid, else title, else its digest
+# Merged feeds may carry the same item for two publishers, one key each
+def itemKey(item, digest, publisher=None):
+    keys = itemKeys(item)
+    if not keys:
+        return "digest:" + digest
+    kind, value = keys[0]
+    if publisher:
+        return "{}|{}:{}".format(publisher, kind, value)
+    return "{}:{}".format(kind, value)
+
+
+class ItemStore:
+    def __init__(self, path, retention=STORE_RETENTION):
+        self.path = path
+        self.retention = retention
+        self.connection = None
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Feed processes may share the file, wait for their writes #
+        self.connection = sqlite3.connect(self.path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        return self
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    # Every stored entry of a source: {key: entry} #
+    def load(self, name):
+        rows = self.connection.execute(
+            "SELECT key, digest, rules, accepted, built, pubdate, story FROM items "
+            "WHERE source = ?",
+            (name,),
+        )
+        return {
+            key: {
+                "key": key,
+                "digest": digest,
+                "rules": rules,
+                "accepted": bool(accepted),
+                "built": json.loads(built) if built else None,
+                "pubDate": pubdate,
+                "story": int(story, 16) if story else None,
+            }
+            for key, digest, rules, accepted, built, pubdate, story in rows
+        }
+
+    # Save new / changed entries, mark the reused ones as seen and drop
+    # entries of this source not seen within retention
+    def save(self, name, changed, reused, now=None):
+        now = now or time.time()
+        with self.connection:
+            self.connection.executemany(
+                UPSERT,
+                [
+                    (
+                        name,
+                        entry["key"],
+                        entry["digest"],
+                        entry["rules"],
+                        int(entry["accepted"]),
+                        json.dumps(entry["built"]) if entry["built"] else None,
+                        entry["pubDate"],
+                        "{:016x}".format(entry["story"]) if entry["story"] is not None else None,
+                        now,
+                        now,
+                    )
+                    for entry in changed
+                ],
+            )
+            self.connection.executemany(
+                "UPDATE items SET last_seen = ? WHERE source = ? AND key = ?",
+                [(now, name, key) for key in reused],
+            )
+            self.connection.execute(
+                "DELETE FROM items WHERE source = ? AND last_seen < ?",
+                (name, now - self.retention),
+            )
@@ -0,0 +1,28 @@
+# Python 3.11.1
+# Text folding shared by blocked words matching and dedupe
+
+import unicodedata
+from functools import lru_cache
+
+
+# Fold one character: NFKD, drop accents, casefold ("É" -> "e", "ß" -> "ss") #
+@lru_cache(maxsize=4096)
+def foldChar(char):
+    return "".join(
+        c for c in unicodedata.normalize("NFKD", char) if not unicodedata.combining(c)
+    ).casefold()
+
+
+# Fold text for matching #
+def foldText(text):
+    if text.isascii():
+        return text.lower()
+    return "".join(map(foldChar, text))
+
+
+# Index in text of every folded character, only built when a text has hits #
+def foldOffsets(text):
+    offsets = []
+    for index, char in enumerate(text):
+        offsets.extend([index] * len(foldChar(char)))
+    return offsets
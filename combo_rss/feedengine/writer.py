@@ -0,0 +1,64 @@
+# Python 3.11.1
+# feed.xml writer
+#
+# Streams the document straight to a binary file, element by element, with
+# the same layout and indentation minidom's toprettyxml gave the players.
+# The file is written next to the output and renamed over it, so index.php
+# never reads a half written feed.
+
+import os
+
+# Item element order per layout #
+LAYOUTS = {
+    "player": ("title", "description", "linkfoto", "pubDate", "category", "cluster"),
+    "channel": ("title", "link", "pubDate", "description"),
+}
+
+XML_DECLARATION = b'<?xml version="1.0" encoding="utf-8"?>\n'
+# Markup escapes, plus control characters XML 1.0 does not allow #
+ESCAPES = str.maketrans(
+    dict(
+        {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;"},
+        **{chr(code): None for code in range(32) if chr(code) not in "\t\n\r"}
+    )
+)
+
+
+def escape(text):
+    return str(text).translate(ESCAPES).encode("utf-8")
+
+
+# Save items to path as UTF8
+# compact: no indentation whitespace, smaller and faster to parse
+def writeFeed(path, items, layout="player", stamp=None, channelInfo=None, compact=False):
+    newline = b"" if compact else b"\n"
+    indent = (lambda depth: b"") if compact else (lambda depth: b"  " * depth)
+    channelInfo = channelInfo or {}
+    temp = "{}.{}.tmp".format(path, os.getpid())
+    with open(temp, "wb") as f:
+        write = f.write
+
+        # <name>text</name> at depth #
+        def writeText(depth, name, text):
+            write(b"%s<%s>%s</%s>%s" % (indent(depth), name, escape(text), name, newline))
+
+        write(XML_DECLARATION)
+        write(b'<rss version="2.0">' + newline)
+        if stamp is not None:
+            writeText(1, b"time", stamp)
+        if not channelInfo and not items:
+            write(indent(1) + b"<channel/>" + newline)
+        else:
+            write(indent(1) + b"<channel>" + newline)
+            for name, text in channelInfo.items():
+                writeText(2, name.encode("ascii"), text)
+            fields = [(name, name.encode("ascii")) for name in LAYOUTS[layout]]
+            for item in items:
+                write(indent(2) + b"<item>" + newline)
+                for name, tag in fields:
+                    if item.get(name) is not None:
+                        writeText(3, tag, item[name])
+                write(indent(2) + b"</item>" + newline)
+            write(indent(1) + b"</channel>" + newline)
+        write(b"</rss>\n")
+    os.replace(temp, path)
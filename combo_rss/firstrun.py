@@ -1,10 +1,8 @@
-import os
 import logging
 
-# This is a tester for running every  listed on array below
-
-python = "Python311/python.exe"
+from feedengine import runConcurrent
 
+# This is a tester for running every  listed on array below
 
 folders = ["exame/default"]
 
@@ -34,33 +32,14 @@ folders = [
     'uol/entretenimento',
 ]
 
-# Get cwd
-cwd = os.getcwd()
-# Define python
-python = f"{cwd}/{python}"
-# Log start
-logging.basicConfig(
-    filename="feed.log", level=logging.INFO, format="%(asctime)s - %(message)s"
-)
-
-for folder in folders:
-    try:
-        # Print
-        print(f"{python} {folder}feed.py")
-        # Log folder
+if __name__ == "__main__":
+    # Log start
+    logging.basicConfig(
+        filename="feed.log", level=logging.INFO, format="%(asctime)s - %(message)s"
+    )
+    # Run every folder concurrently, each one with its own deadline
+    for folder in folders:
         logging.info(f"RUNNING {folder}")
-        # Define path
-        path = f"{cwd}/{folder}"
-        # Change dir
-        os.chdir(path)
-        # Run script
-        work = os.system(f"{python} feed.py")
-        # Log result
-        logging.info(f"RETURNS {work}")
-        # Change dir
-        os.chdir(cwd)
-    except Exception as e:
-        print(e)
-        # Log error
-        logging.error(f"ERROR {e}")
-        pass
+    results = runConcurrent(folders, parallel=8, deadline=120)
+    for folder, work in results.items():
+        print(f"{folder} RETURNS {work['status']} in {work['seconds']}s")